@@ -0,0 +1,55 @@
+"""
+Atomic checkpoints of time integrator states, to restart long runs that
+were interrupted (see run_simulation and newmark, resume=True).
+"""
+import os
+import tempfile
+import time
+import numpy as np
+
+def save_checkpoint(path, **state):
+    """
+    Write the arrays and scalars of state to the .npz file path. The data
+    go to a temporary file in the same directory, which replaces path only
+    once it is complete, so path always holds a whole checkpoint.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def load_checkpoint(path, mesh_hash=None):
+    """
+    Read a checkpoint as a dict of arrays; raise ValueError if it was
+    written for another mesh_hash.
+    """
+    with np.load(path) as data:
+        state = {key: data[key] for key in data.files}
+    if mesh_hash is not None and str(state['mesh_hash']) != mesh_hash:
+        raise ValueError('checkpoint %s was written for another mesh or setup' % path)
+    return state
+
+def checkpointer(path, every=None, seconds=None, flush=None):
+    """
+    Return save(n, **state), which writes a checkpoint of step n when n is
+    a multiple of every or when seconds have passed since the last one,
+    and returns whether it did. flush() is called first, e.g. to write
+    the outputs the checkpoint refers to.
+    """
+    last = [time.monotonic()]
+    def save(n, **state):
+        due = (every is not None and n % every == 0) or \
+              (seconds is not None and time.monotonic() - last[0] >= seconds)
+        if due:
+            if flush is not None:
+                flush()
+            save_checkpoint(path, n=n, **state)
+            last[0] = time.monotonic()
+        return due
+    return save
@@ -1,91 +1,144 @@
 import numpy as np
-from random import choice
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
 def deviatoric(tensor):
     """
-    Calculates the deviatoric part of a tensor.
+    Calculates the deviatoric part of a tensor, or of each tensor of an
+    (N, 3, 3) stack.
     This removes the hydrostatic (volume-changing) component.
     """
-    return tensor - np.trace(tensor)/3 * np.eye(3)
+    tensor = np.asarray(tensor)
+    trace = np.trace(tensor, axis1=-2, axis2=-1)[..., None, None]
+    return tensor - trace/3 * np.eye(3)
 
 def tresca_norm(tensor):
     """
-    Computes the Tresca norm of a tensor, defined as the difference
-    between the maximum and minimum eigenvalues. This is related to the
-    maximum shear stress in a material.
+    Computes the Tresca norm of a symmetric tensor, or of each tensor of an
+    (N, 3, 3) stack, defined as the difference between the maximum and
+    minimum eigenvalues. This is related to the maximum shear stress in a
+    material.
+    Closed form: with s the deviator, p = |s|/sqrt(6) and
+    cos(3 phi) = det(s/p)/2, the eigenvalues are tr/3 + 2p cos(phi + 2k pi/3)
+    and their range is 2 sqrt(3) p sin(phi + pi/3).
     """
-    eigs = np.linalg.eigvalsh(tensor)
-    return max(eigs) - min(eigs)
+    s = deviatoric(tensor)
+    p = np.sqrt(np.sum(s**2, axis=(-2, -1)) / 6)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = np.linalg.det(s) / (2 * p**3)
+    phi = np.arccos(np.clip(np.nan_to_num(r), -1, 1)) / 3
+    return 2 * np.sqrt(3) * p * np.sin(phi + np.pi/3)
 
 def distance(eps1, eps2):
     """
     Calculates the 'distance' between two tensors using the Tresca norm
-    of their difference.
+    of their difference. Either argument may be an (N, 3, 3) stack.
     """
-    return tresca_norm(eps1 - eps2)
+    return tresca_norm(np.asarray(eps1) - np.asarray(eps2))
 
-def compute_diameter(E):
+def deviatoric_components(E):
     """
-    Finds the diameter of a set of tensors E, which is the maximum
-    Tresca distance between any two tensors in the set. This function uses
-    an iterative algorithm to find the pair(s) of tensors that define this diameter.
+    5-component representation y of the deviatoric part s of each tensor of
+    the stack E, in an orthonormal basis of trace-free symmetric tensors:
+    y = ((s11-s22)/sqrt(2), sqrt(3/2) s33, sqrt(2) s12, sqrt(2) s13, sqrt(2) s23),
+    so that |y| is the Frobenius norm of s. Tresca distances only depend on
+    the deviatoric parts.
     """
+    E = np.asarray(E, dtype=float)
+    s = deviatoric(E)
+    return np.stack([(s[..., 0, 0] - s[..., 1, 1]) / np.sqrt(2),
+                     np.sqrt(1.5) * s[..., 2, 2],
+                     np.sqrt(2) * s[..., 0, 1],
+                     np.sqrt(2) * s[..., 0, 2],
+                     np.sqrt(2) * s[..., 1, 2]], axis=-1)
+
+def tresca_components(y):
+    """
+    Tresca norm of deviatoric tensors given by their 5 components (see
+    deviatoric_components), with the closed form of tresca_norm and an
+    explicit determinant.
+    """
+    y = np.asarray(y, dtype=float)
+    s33 = np.sqrt(2/3) * y[..., 1]
+    s11 = y[..., 0] / np.sqrt(2) - s33 / 2
+    s22 = -y[..., 0] / np.sqrt(2) - s33 / 2
+    s12, s13, s23 = y[..., 2] / np.sqrt(2), y[..., 3] / np.sqrt(2), y[..., 4] / np.sqrt(2)
+    det = s11*s22*s33 + 2*s12*s13*s23 - s11*s23**2 - s22*s13**2 - s33*s12**2
+    p = np.sqrt(np.sum(y**2, axis=-1) / 6)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = det / (2 * p**3)
+    phi = np.arccos(np.clip(np.nan_to_num(r), -1, 1)) / 3
+    return 2 * np.sqrt(3) * p * np.sin(phi + np.pi/3)
+
+def compute_diameter(E, n_directions=32, chunk_size=1024, seed=0, rtol=1e-5, atol=1e-8):
+    """
+    Finds the diameter of a set of tensors E ((N, 3, 3) stack), which is the
+    maximum Tresca distance between any two tensors in the set, and the
+    pairs of tensors that define it (all the pairs within np.isclose of the
+    maximum with rtol, atol: lower them for long, finely sampled histories,
+    which have many nearly diametral pairs).
+    Exact, and close to linear time for usual strain paths:
+    - the tensors are mapped to 5 deviatoric components y;
+    - a lower bound L comes from the extreme points of y along the axes and
+      n_directions random directions, refined by farthest point sweeps;
+    - each tensor i gets an upper bound U_i >= max_j T(x_i - x_j): for a
+      centre c, T(x_i - c) + max_j T(x_j - c) by the triangle inequality,
+      and sqrt(2)(|y_i - c| + max_j |y_j - c|) since T <= sqrt(2)|y|;
+    - both ends of a diametral pair have U_i >= L, so only these candidates
+      are compared pairwise, by blocks of chunk_size rows.
+    """
+    E = np.asarray(E, dtype=float)
     if len(E) < 2:
         return None, 0
-    Ecurr = list(E)
-    eps_i = choice(Ecurr)
-    max_dist = 0
-    diameter = None
-    stop = False
-    while not stop:
-        dists = [distance(eps_i, eps) for eps in Ecurr]
-        k = np.argmax(dists)
-        eps_k = Ecurr[k]
-        dist_ik = dists[k]
-        if dist_ik > max_dist:
-            diameter = (eps_i, eps_k)
-            max_dist = dist_ik
-        if diameter is None:
+    Y = deviatoric_components(E)
+
+    # Lower bound: extreme points along sampled directions
+    rng = np.random.default_rng(seed)
+    directions = np.vstack([np.eye(5), rng.normal(size=(n_directions, 5))])
+    extremes = set()
+    for u in directions:
+        projection = Y @ u
+        extremes.update((int(np.argmin(projection)), int(np.argmax(projection))))
+    extremes = np.array(sorted(extremes))
+    D = tresca_components(Y[extremes, None] - Y[None, extremes])
+    a, b = np.unravel_index(np.argmax(D), D.shape)
+    i, j, L = extremes[a], extremes[b], D[a, b]
+    # Farthest point sweeps from the best pair
+    while True:
+        d = tresca_components(Y - Y[j])
+        k = np.argmax(d)
+        if not d[k] > L:
             break
-        p, q = diameter
-        m = (p + q) / 2
-        r = max_dist / 2
-        to_keep = []
-        for eps in Ecurr:
-            d = distance(eps, m)
-            if d >= r:
-                to_keep.append(eps)
-        Ecurr = to_keep
-        remaining = [eps for eps in Ecurr if not np.allclose(eps, p) and not np.allclose(eps, q)]
-        if len(remaining) > 0:
-            dists_m = [distance(eps, m) for eps in Ecurr]
-            new_k = np.argmax(dists_m)
-            eps_i = Ecurr[new_k]
-        else:
-            stop = True
-    p, q = diameter
-    m = (p + q)/2
-    r = max_dist / 2
-    Eout = [eps for eps in E if distance(eps, m) >= r]
-    Eout_without_diam = [eps for eps in Eout if not np.allclose(eps, p) and not np.allclose(eps, q)]
-    if len(Eout_without_diam) == 0:
-        return [(p, q)], max_dist
-    else:
-        list_diameters = []
-        current_max = max_dist
-        for eps_k in Eout:
-            for eps_l in E:
-                if np.allclose(eps_k, eps_l):
-                    continue
-                d_kl = distance(eps_k, eps_l)
-                if d_kl > current_max:
-                    current_max = d_kl
-                    list_diameters = [(eps_k, eps_l)]
-                elif np.isclose(d_kl, current_max):
-                    list_diameters.append((eps_k, eps_l))
-        return list_diameters, current_max
+        i, j, L = j, k, d[k]
+    if L == 0:
+        return None, 0
+
+    # Upper bounds per tensor, from two centres
+    U = np.full(len(Y), np.inf)
+    for c in [(Y[i] + Y[j]) / 2, Y.mean(axis=0)]:
+        T_c = tresca_components(Y - c)
+        F_c = np.linalg.norm(Y - c, axis=1)
+        U = np.minimum(U, np.minimum(T_c + T_c.max(), np.sqrt(2) * (F_c + F_c.max())))
+    # Pairs within np.isclose of the diameter D >= L have T >= (1-rtol)L - atol
+    threshold = (1 - rtol) * L - atol
+    candidates = np.nonzero(U >= threshold)[0]
+
+    # Exact check among the candidates
+    Yc = Y[candidates]
+    rows, cols, dists = [], [], []
+    for start in range(0, len(Yc), chunk_size):
+        d = tresca_components(Yc[start:start + chunk_size, None] - Yc[None])
+        r, q = np.nonzero(d >= threshold)
+        keep = q > r + start
+        rows.append(r[keep] + start)
+        cols.append(q[keep])
+        dists.append(d[r[keep], q[keep]])
+    rows, cols, dists = np.concatenate(rows), np.concatenate(cols), np.concatenate(dists)
+    max_d = dists.max()
+    ties = np.isclose(dists, max_d, rtol=rtol, atol=atol)
+    k, l = candidates[rows[ties]], candidates[cols[ties]]
+    distinct = ~np.all(np.isclose(E[k], E[l]), axis=(-2, -1))
+    return [(E[i], E[j]) for i, j in zip(k[distinct], l[distinct])], max_d
 
 def get_critical_planes(eps1, eps2):
     """
@@ -146,21 +199,19 @@ def plot_critical_planes(n1, n2):
 def generate_strains(num_points=1000):
     """
     Generates a sample non-proportional, multiaxial strain history
-    for demonstration purposes.
+    for demonstration purposes, as an (N, 3, 3) stack.
     """
     t = np.linspace(0, 1, num_points, endpoint=False)
     eps11 = 0.005 * np.cos(3 * np.pi * t)
     eps22 = -0.001 * np.cos(2 * np.pi * t)
     eps33 = 0.0075 * np.cos(4 * np.pi * t)
     eps12 = -0.002 * np.cos(5 * np.pi * t)
-    eps = []
-    for i in range(num_points):
-        mat = np.array([[eps11[i], eps12[i], 0],
-                        [eps12[i], eps22[i], 0],
-                        [0, 0, eps33[i]]])
-        dev = deviatoric(mat)
-        eps.append(dev)
-    return eps
+    eps = np.zeros((num_points, 3, 3))
+    eps[:, 0, 0] = eps11
+    eps[:, 1, 1] = eps22
+    eps[:, 2, 2] = eps33
+    eps[:, 0, 1] = eps[:, 1, 0] = eps12
+    return deviatoric(eps)
 
 # --- Main execution block ---
 
@@ -1,111 +1,492 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
 from fe_appprox1D import *
+from modal import modal_solver
+from checkpoint import checkpointer, load_checkpoint
 import sympy as sym
+import scipy.sparse
+import scipy.sparse.linalg
+import csv
+import os
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
-def run_simulation():
-    # Parameters
-    L = 1.0
-    T = 2
-    c = 1.0 # Wave speed
-    Ne = 50  # Number of elements
-    d = 2    # Degree of basis functions
-    
+def central_difference(apply_K, apply_M, solve_M, u0, v0, dt, Nt, start=None):
+    """
+    Central difference time stepping of M u'' + K u = 0, where M and K are
+    given by the functions apply_M, apply_K and solve_M. Only the last two
+    states are kept: yield (n, u_n) for n = 0, ..., Nt.
+    start=(n, u_{n-1}, u_n) restarts from step n (e.g. a checkpoint) and
+    yields from n+1 on.
+    """
+    if start is None:
+        u_nm1 = np.array(u0, dtype=float)
+        yield 0, u_nm1
+        # Initial acceleration
+        # M a0 + K u0 = 0 => a0 = -M^-1 K u0
+        a0 = solve_M(-apply_K(u_nm1))
+        # First step (u1) using Taylor expansion
+        # u1 = u0 + dt * v0 + 0.5 * dt^2 * a0
+        u_n = u_nm1 + dt * v0 + 0.5 * dt**2 * a0
+        yield 1, u_n
+        start = (1, u_nm1, u_n)
+    n0, u_nm1, u_n = start
+    for n in range(n0, Nt):
+        # Central difference: M (u_{n+1} - 2u_n + u_{n-1})/dt^2 + K u_n = 0
+        # M u_{n+1} = dt^2 (-K u_n) + M (2u_n - u_{n-1})
+        rhs = (dt**2) * (-apply_K(u_n)) + apply_M(2 * u_n - u_nm1)
+        u_nm1, u_n = u_n, solve_M(rhs)
+        yield n + 1, u_n
+
+def explicit_central_difference(K, m, u0, v0, dt, Nt, start=None):
+    """
+    Central difference time stepping of diag(m) u'' + K u = 0 with a lumped
+    mass vector m: each step is one sparse matvec and an elementwise
+    divide, no linear solve. Yield (n, u_n) for n = 0, ..., Nt, or from
+    n+1 on when restarting from start=(n, u_{n-1}, u_n).
+    """
+    if start is None:
+        u_nm1 = np.array(u0, dtype=float)
+        yield 0, u_nm1
+        # u1 = u0 + dt * v0 + 0.5 * dt^2 * a0 with a0 = -K u0 / m
+        u_n = u_nm1 + dt * v0 - 0.5 * dt**2 * (K @ u_nm1) / m
+        yield 1, u_n
+        start = (1, u_nm1, u_n)
+    n0, u_nm1, u_n = start
+    for n in range(n0, Nt):
+        u_nm1, u_n = u_n, 2 * u_n - u_nm1 - dt**2 * (K @ u_n) / m
+        yield n + 1, u_n
+
+# Largest eigenvalue of K phi = lambda M phi, per mesh_hash key
+_LAMBDA_MAX = {}
+
+def stable_time_step(apply_K, apply_M, solve_M, n_dofs, safety=0.9, key=None):
+    """
+    Time step safety * 2/omega_max of the central difference scheme, where
+    omega_max^2 is the largest eigenvalue of K phi = lambda M phi. It is
+    estimated by a few Lanczos iterations (eigsh) on the operators
+    apply_K, apply_M and solve_M, and cached under key (see mesh_hash).
+    The Lanczos estimate is a lower bound: keep safety below 1.
+    """
+    if key is None or key not in _LAMBDA_MAX:
+        operator = lambda f: scipy.sparse.linalg.LinearOperator((n_dofs, n_dofs), matvec=f)
+        lambda_max = scipy.sparse.linalg.eigsh(operator(apply_K), k=1, M=operator(apply_M),
+                                               Minv=operator(solve_M), which='LA', tol=1e-4,
+                                               return_eigenvectors=False)[0]
+        if key is None:
+            return safety * 2 / np.sqrt(lambda_max)
+        _LAMBDA_MAX[key] = lambda_max
+    return safety * 2 / np.sqrt(_LAMBDA_MAX[key])
+
+def gaussian_pulse(x, centre=0.5, width=0.1):
+    """Initial displacement exp(-((x - centre)/width)^2)."""
+    return np.exp(-((x - centre) / width)**2)
+
+def open_snapshot_store(path, n_frames, n_nodes):
+    """
+    Create a zero-filled (n_frames, n_nodes) .npy file mapped in memory;
+    rows are written as the simulation runs and flushed to disk by the OS.
+    """
+    return np.lib.format.open_memmap(path, mode='w+', dtype=float, shape=(n_frames, n_nodes))
+
+# Per-worker renderer state: (snapshots, canvas, axes, line, background)
+_RENDERER = None
+
+def _init_renderer(snapshot_path, nodes, figsize, dpi):
+    """
+    Worker initializer: map the snapshots, build one Agg figure and keep
+    its static background, on which the line and title are blitted.
+    """
+    global _RENDERER
+    u = np.load(snapshot_path, mmap_mode='r')
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    line, = ax.plot(nodes, u[0], 'b-', animated=True)
+    ax.title.set_animated(True)
+    ax.set_ylim(-1.2, 1.2)
+    ax.set_xlim(nodes[0], nodes[-1])
+    ax.set_xlabel('x')
+    ax.set_ylabel('u')
+    canvas.draw()
+    _RENDERER = (u, canvas, ax, line, canvas.copy_from_bbox(fig.bbox))
+
+def _render_frames(frames, frame_dt):
+    """Draw the given frames with the worker figure, return them as images."""
+    u, canvas, ax, line, background = _RENDERER
+    images = []
+    for frame in frames:
+        canvas.restore_region(background)
+        line.set_ydata(u[frame])
+        ax.set_title(f'Time: {frame*frame_dt:.3f}s')
+        ax.draw_artist(line)
+        ax.draw_artist(ax.title)
+        rgb = np.asarray(canvas.buffer_rgba())[..., :3]
+        # Palette conversion is done here, in parallel, rather than by the encoder
+        images.append(Image.fromarray(rgb).quantize(256, method=Image.Quantize.FASTOCTREE))
+    return images
+
+def animate_snapshots(snapshot_path, nodes, frame_dt, filename='bar_simulation.gif',
+                      frame_stride=1, max_pixels=None, fps=30, max_workers=None,
+                      figsize=(6.4, 4.8), dpi=100):
+    """
+    Animate the snapshots stored in snapshot_path into filename, a GIF or,
+    with a .png name, an APNG. The frames are rasterized in a process pool,
+    each worker blitting the line on its own Agg figure from the
+    memory-mapped file, and encoded in order.
+    frame_stride keeps one snapshot in frame_stride and max_pixels caps
+    the frame size (width*height) by lowering the dpi.
+    """
+    n_frames = len(np.load(snapshot_path, mmap_mode='r'))
+    if max_pixels is not None:
+        dpi = min(dpi, np.sqrt(max_pixels / (figsize[0] * figsize[1])))
+    frames = np.arange(0, n_frames, frame_stride)
+    n_workers = max_workers or os.cpu_count() or 1
+    chunks = np.array_split(frames, min(len(frames), 4 * n_workers))
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_renderer,
+                             initargs=(snapshot_path, np.asarray(nodes), figsize, dpi)) as pool:
+        chunks = pool.map(_render_frames, chunks, [frame_dt] * len(chunks))
+        images = (image for chunk in chunks for image in chunk)
+        first = next(images)
+        if filename.lower().endswith('.png'):
+            # The APNG writer needs all the frames at once, GIF streams them
+            images = list(images)
+        first.save(filename, save_all=True, append_images=images,
+                   duration=1000 * frame_stride / fps, loop=0)
+    print(f"Animation saved as {filename}")
+
+def run_simulation(matrix_free=False, mass_lumping=None,
+                   snapshot_path='bar_snapshots.npy', snapshot_stride=5,
+                   L=1.0, T=2, c=1.0, Ne=50, d=2, point_distribution='uniform',
+                   dt=None, safety=0.9,
+                   modal_modes=None, modes_cache='.modes_cache', checkpoint_path=None,
+                   checkpoint_every=None, checkpoint_seconds=None, resume=False,
+                   animate=True):
+    """
+    Solve u_tt = c^2 u_xx on a fixed-fixed bar with P_d elements and the
+    central difference scheme, and save the animation.
+    With matrix_free=True the mass and stiffness matrices are never
+    stored: they are applied element by element and the mass system is
+    solved with Jacobi-preconditioned CG.
+    mass_lumping ('row_sum' or 'gll') replaces the consistent mass matrix
+    by a diagonal one and uses the solve-free explicit_central_difference.
+    Only the current states are kept in memory; every snapshot_stride-th
+    step is streamed to the .npy file snapshot_path, which the animation
+    reads back frame by frame.
+    L is the bar length, T the end time, c the wave speed, Ne the number
+    of elements and d the degree of the basis functions, whose nodes are
+    placed by point_distribution ('uniform' or 'GLL', see bar_mesh);
+    mass_lumping='gll' needs 'GLL' nodes for d >= 3.
+    dt=None uses the CFL guess 0.1*h/c, dt='auto' the stable step
+    safety*2/omega_max of the scheme (see stable_time_step), cached per
+    mesh; a number is used as is.
+    With modal_modes=k (consistent mass only), the frames are evaluated
+    directly by superposition of the lowest k modes (see modal.py) instead
+    of time stepping; the modes are cached on disk in modes_cache per mesh.
+    With checkpoint_path, the state (u_n, u_{n-1}, n, dt and a hash of the
+    mesh and setup) is saved atomically every checkpoint_every steps and/or
+    checkpoint_seconds seconds. resume=True continues from that checkpoint
+    and the snapshots already written, bit for bit.
+    animate=False only writes the snapshots.
+    """
     # Mesh
-    nodes = np.linspace(0, L, Ne * d + 1)
-    elements = [[i + j for j in range(d + 1)] for i in range(0, Ne * d, d)]
+    nodes, elements = bar_mesh(L, Ne, d, point_distribution)
     
     # Basis functions
-    phi = basis(d=d, symbolic=False)
-    
-    # Assemble Mass and Stiffness Matrices
-    print("Assembling matrices...")
-    # Mass matrix (using element_matrix)
-    M, _ = assemble(nodes, elements, phi, f=None, symbolic=False, matrix_function=element_matrix)
-    M = np.array(M, dtype=float)
-    
-    # Stiffness matrix (using element_stiffness_matrix)
-    K, _ = assemble(nodes, elements, phi, f=None, symbolic=False, matrix_function=element_stiffness_matrix)
-    K = np.array(K, dtype=float) * (c**2) # Scale by c^2 for wave equation u_tt - c^2 u_xx = 0
+    phi = basis(d=d, point_distribution=point_distribution, symbolic=False)
     
+    # Boundary conditions (Fixed ends: u(0) = u(L) = 0)
+    # We will enforce this by solving for inner nodes only or using penalty.
+    # Let's use the method of removing rows/cols for fixed DOFs.
+    fixed_dofs = [0, len(nodes) - 1]
+    free_dofs = [i for i in range(len(nodes)) if i not in fixed_dofs]
+
+    if mass_lumping is not None:
+        print("Assembling lumped mass and sparse stiffness...")
+        m, _ = assemble_sparse(nodes, elements, phi, mass_lumping=mass_lumping)
+        K, _ = assemble_sparse(nodes, elements, phi, matrix_function=element_stiffness_matrix)
+        m_free = m[free_dofs]
+        K_free = K[free_dofs][:, free_dofs] * (c**2)
+        apply_M = lambda v: m_free * v
+        apply_K = lambda v: K_free @ v
+        solve_M = lambda v: v / m_free
+    elif matrix_free:
+        M_op = mass_operator(nodes, elements, phi, free_dofs)
+        K_op = stiffness_operator(nodes, elements, phi, free_dofs) * (c**2)
+        jacobi = 1.0 / matrix_free_diagonal(nodes, elements, phi, element_matrix, free_dofs)
+        P = scipy.sparse.linalg.LinearOperator(M_op.shape, matvec=lambda r: jacobi * r)
+        apply_M = M_op.matvec
+        apply_K = K_op.matvec
+        def solve_M(rhs):
+            sol, info = scipy.sparse.linalg.cg(M_op, rhs, rtol=1e-12, M=P)
+            if info != 0:
+                raise np.linalg.LinAlgError('CG did not converge (info=%d)' % info)
+            return sol
+    else:
+        # Assemble Mass and Stiffness Matrices
+        print("Assembling matrices...")
+        # Mass matrix (using element_matrix), sparse CSR
+        M, _ = assemble_sparse(nodes, elements, phi, matrix_function=element_matrix)
+        
+        # Stiffness matrix (using element_stiffness_matrix)
+        K, _ = assemble_sparse(nodes, elements, phi, matrix_function=element_stiffness_matrix)
+        K = K * (c**2) # Scale by c^2 for wave equation u_tt - c^2 u_xx = 0
+
+        M_free = M[free_dofs][:, free_dofs]
+        K_free = K[free_dofs][:, free_dofs]
+        # M_free is banded and SPD: factorize it once (banded Cholesky)
+        # and reuse the factor at every step
+        apply_M = lambda v: M_free @ v
+        apply_K = lambda v: K_free @ v
+        solve_M = factorize(M_free)
+
     # Time stepping parameters
-    h = nodes[1] - nodes[0]
-    dt = 0.1 * h / c  # CFL condition
+    if checkpoint_path is not None:
+        setup_hash = mesh_hash(nodes, elements, d, point_distribution, c, T, mass_lumping,
+                               matrix_free, snapshot_stride)
+    if resume:
+        if checkpoint_path is None:
+            raise ValueError('resume=True needs checkpoint_path')
+        state = load_checkpoint(checkpoint_path, setup_hash)
+        dt = float(state['dt'])
+        print(f"Resuming from step {int(state['n'])} of {checkpoint_path}")
+    elif dt is None:
+        h = nodes[1] - nodes[0]
+        dt = 0.1 * h / c  # CFL condition
+    elif dt == 'auto':
+        key = mesh_hash(nodes, elements, d, point_distribution, c, mass_lumping)
+        dt = stable_time_step(apply_K, apply_M, solve_M, len(free_dofs), safety, key)
+        print(f"Stable time step (safety {safety}): dt = {dt}")
     Nt = int(T / dt)
     print(f"dt = {dt}, Nt = {Nt}")
     
     # Initial conditions
     x = nodes
-    u0 = np.exp(-100 * (x - 0.5)**2) # Gaussian pulse
+    u0 = gaussian_pulse(x, centre=L/2) # Gaussian pulse
     v0 = np.zeros_like(u0)
     
-    # Arrays to store solution
-    u = np.zeros((Nt + 1, len(nodes)))
-    u[0] = u0
-    
-    # Boundary conditions (Fixed ends: u(0) = u(L) = 0)
-    # We will enforce this by solving for inner nodes only or using penalty.
-    # Let's use the method of removing rows/cols for fixed DOFs.
-    fixed_dofs = [0, len(nodes) - 1]
-    free_dofs = [i for i in range(len(nodes)) if i not in fixed_dofs]
-    
-    M_free = M[np.ix_(free_dofs, free_dofs)]
-    K_free = K[np.ix_(free_dofs, free_dofs)]
+    # Stream every snapshot_stride-th state to disk, fixed DOFs stay zero
+    n_frames = Nt // snapshot_stride + 1
+    if resume:
+        snapshots = np.lib.format.open_memmap(snapshot_path, mode='r+')
+        start = (int(state['n']), state['u_nm1'], state['u_n'])
+    else:
+        snapshots = open_snapshot_store(snapshot_path, n_frames, len(nodes))
+        start = None
     
-    # Pre-factorize M_free for faster solution
-    # For explicit scheme with consistent mass, we solve M * u_new = rhs
+    if modal_modes is not None:
+        if mass_lumping is not None or matrix_free:
+            raise ValueError('modal_modes needs the assembled consistent mass matrix')
+        print(f"Modal superposition with {modal_modes} modes...")
+        u_t = modal_solver(K_free, M_free, u0[free_dofs], v0[free_dofs], modal_modes,
+                           cache_dir=modes_cache, key=mesh_hash(nodes, elements, d, point_distribution, c))
+        frame_times = np.arange(n_frames) * snapshot_stride * dt
+        for first in range(0, n_frames, 100):
+            snapshots[first:first + 100, free_dofs] = u_t(frame_times[first:first + 100]).T
+        steps = iter(())
+    elif mass_lumping is not None:
+        steps = explicit_central_difference(K_free, m_free, u0[free_dofs], v0[free_dofs], dt, Nt, start)
+    else:
+        steps = central_difference(apply_K, apply_M, solve_M, u0[free_dofs], v0[free_dofs], dt, Nt, start)
     
-    # Initial acceleration
-    # M a0 + K u0 = 0 => a0 = -M^-1 K u0
-    rhs_0 = -K_free @ u0[free_dofs]
-    a0_free = np.linalg.solve(M_free, rhs_0)
-    
-    # First step (u1) using Taylor expansion
-    # u1 = u0 + dt * v0 + 0.5 * dt^2 * a0
-    u[1, free_dofs] = u0[free_dofs] + dt * v0[free_dofs] + 0.5 * dt**2 * a0_free
-    
-    # Time loop
+    save = None
+    if checkpoint_path is not None and (checkpoint_every or checkpoint_seconds):
+        save = checkpointer(checkpoint_path, checkpoint_every, checkpoint_seconds, snapshots.flush)
+    u_prev = None if start is None else start[2]
+
     print("Running simulation...")
-    for n in range(1, Nt):
-        # Central difference: M (u_{n+1} - 2u_n + u_{n-1})/dt^2 + K u_n = 0
-        # M u_{n+1} = dt^2 (-K u_n) + M (2u_n - u_{n-1})
-        
-        u_n = u[n, free_dofs]
-        u_nm1 = u[n-1, free_dofs]
-        
-        rhs = (dt**2) * (-K_free @ u_n) + M_free @ (2 * u_n - u_nm1)
-        u_new_free = np.linalg.solve(M_free, rhs)
-        
-        u[n+1, free_dofs] = u_new_free
-        
+    for n, u_n in steps:
+        if n % snapshot_stride == 0:
+            snapshots[n // snapshot_stride, free_dofs] = u_n
         if n % 100 == 0:
             print(f"Step {n}/{Nt}")
+        if save is not None and u_prev is not None:
+            save(n, u_n=u_n, u_nm1=u_prev, dt=dt, mesh_hash=setup_hash)
+        u_prev = u_n
+    snapshots.flush()
+    del snapshots
 
     # Animation
-    print("Creating animation...")
-    fig, ax = plt.subplots()
-    line, = ax.plot(nodes, u[0], 'b-')
-    ax.set_ylim(-1.2, 1.2)
-    ax.set_xlim(0, L)
-    ax.set_xlabel('x')
-    ax.set_ylabel('u')
-    ax.set_title('1D Wave Equation FEM')
-    
-    def update(frame):
-        # Subsample frames to keep GIF size reasonable
-        step = frame * 5
-        if step >= Nt:
-            step = Nt
-        line.set_ydata(u[step])
-        ax.set_title(f'Time: {step*dt:.3f}s')
-        return line,
-
-    num_frames = Nt // 5
-    ani = FuncAnimation(fig, update, frames=num_frames, blit=True)
-    
-    ani.save('bar_simulation.gif', writer=PillowWriter(fps=30))
-    print("Animation saved as bar_simulation.gif")
+    if animate:
+        print("Creating animation...")
+        animate_snapshots(snapshot_path, nodes, snapshot_stride * dt)
+
+def bar_mesh(L=1.0, Ne=50, d=2, point_distribution='uniform'):
+    """
+    Ne elements of degree d on [0, L]. The nodes inside each element are
+    those of basis(d, point_distribution): equispaced for 'uniform', at
+    the Gauss-Lobatto-Legendre points for 'GLL'. Return nodes, elements.
+    """
+    if point_distribution == 'uniform':
+        nodes = np.linspace(0, L, Ne * d + 1)
+    elif point_distribution == 'GLL':
+        X = np.sort(gauss_lobatto(d + 1)[0])
+        x_e = np.linspace(0, L, Ne + 1)
+        h = np.diff(x_e)
+        nodes = np.append((x_e[:-1, None] + h[:, None] / 2 * (X[:-1] + 1)).ravel(), L)
+    else:
+        # Chebyshev nodes miss the element ends, so elements would not connect
+        raise ValueError("point_distribution must be 'uniform' or 'GLL'")
+    elements = np.arange(0, Ne * d, d)[:, None] + np.arange(d + 1)
+    return nodes, elements
+
+def bar_matrices(L=1.0, Ne=50, d=2, point_distribution='uniform'):
+    """
+    Mesh of the fixed-fixed bar (see bar_mesh) and its mass and stiffness
+    matrices (for c = 1) restricted to the free DOFs. Return nodes,
+    free_dofs, M_free and K_free (CSR).
+    """
+    nodes, elements = bar_mesh(L, Ne, d, point_distribution)
+    phi = basis(d=d, point_distribution=point_distribution, symbolic=False)
+    free_dofs = np.arange(1, len(nodes) - 1)
+    M, _ = assemble_sparse(nodes, elements, phi, matrix_function=element_matrix)
+    K, _ = assemble_sparse(nodes, elements, phi, matrix_function=element_stiffness_matrix)
+    return nodes, free_dofs, M[free_dofs][:, free_dofs].tocsr(), K[free_dofs][:, free_dofs].tocsr()
+
+def bar_metrics(nodes, free_dofs, M_free, K_free, c=1.0, T=2, u0=None, dt=None):
+    """
+    Run the consistent-mass scheme of run_simulation without storing
+    snapshots. u0 is the initial displacement on the free DOFs (default:
+    the Gaussian pulse), or a block with one column per ensemble member,
+    which are all advanced together. dt is chosen as in run_simulation.
+    Return the maximum displacement, the maximum relative energy drift
+    (per member for a block), dt and Nt.
+    """
+    K_free = K_free * (c**2)
+    apply_M = lambda v: M_free @ v
+    apply_K = lambda v: K_free @ v
+    solve_M = factorize(M_free)
+    if dt is None:
+        h = nodes[1] - nodes[0]
+        dt = 0.1 * h / c  # CFL condition
+    elif dt == 'auto':
+        dt = stable_time_step(apply_K, apply_M, solve_M, len(free_dofs),
+                              key=mesh_hash(nodes, free_dofs, c))
+    Nt = int(T / dt)
+    if u0 is None:
+        u0 = gaussian_pulse(nodes[free_dofs], centre=nodes[-1]/2)
+    v0 = np.zeros_like(u0)
+    def energy(u, v):
+        return 0.5 * (np.sum(v * apply_M(v), axis=0) + np.sum(u * apply_K(u), axis=0))
+    E0 = energy(u0, v0)
+    max_u, drift = 0.0, 0.0
+    u_nm2 = u_nm1 = None
+    for n, u_n in central_difference(apply_K, apply_M, solve_M, u0, v0, dt, Nt):
+        max_u = np.maximum(max_u, np.abs(u_n).max(axis=0))
+        if u_nm2 is not None:
+            # Energy at step n-1 with the central velocity
+            drift = np.maximum(drift, abs(energy(u_nm1, (u_n - u_nm2) / (2*dt)) - E0) / E0)
+        u_nm2, u_nm1 = u_nm1, u_n
+    if np.ndim(u0) == 1:
+        max_u, drift = float(max_u), float(drift)
+    return {'max_displacement': max_u, 'energy_drift': drift, 'dt': float(dt), 'Nt': Nt}
+
+def ensemble_simulation(centres, widths, L=1.0, T=2, c=1.0, Ne=50, d=2, dt=None,
+                        point_distribution='uniform'):
+    """
+    Advance one Gaussian pulse per (centre, width) pair as a single block
+    state of shape (N_dofs, N_members): each step is one sparse matrix by
+    block product and one multi-RHS solve with the factorized mass matrix.
+    Return per-member diagnostics (see bar_metrics) instead of histories.
+    """
+    centres, widths = np.broadcast_arrays(np.asarray(centres, dtype=float),
+                                          np.asarray(widths, dtype=float))
+    nodes, free_dofs, M_free, K_free = bar_matrices(L, Ne, d, point_distribution)
+    u0 = gaussian_pulse(nodes[free_dofs, None], centres.ravel(), widths.ravel())
+    diagnostics = {'centre': centres.ravel(), 'width': widths.ravel()}
+    diagnostics.update(bar_metrics(nodes, free_dofs, M_free, K_free, c, T, u0, dt))
+    return diagnostics
+
+def _share(array):
+    """Copy array into a new shared memory block, return it and its spec."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+def _attach(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype, buffer=shm.buf)
+
+def _sweep_case(case, mesh_specs):
+    """Worker: run one case on matrices read from shared memory."""
+    start = time.perf_counter()
+    blocks, arrays = [], {}
+    for key, spec in mesh_specs.items():
+        shm, arrays[key] = _attach(spec)
+        blocks.append(shm)
+    try:
+        n = len(arrays['free_dofs'])
+        M_free = scipy.sparse.csr_matrix((arrays['M_data'], arrays['M_indices'], arrays['M_indptr']),
+                                         shape=(n, n), copy=False)
+        K_free = scipy.sparse.csr_matrix((arrays['K_data'], arrays['K_indices'], arrays['K_indptr']),
+                                         shape=(n, n), copy=False)
+        row = dict(case)
+        row.update(bar_metrics(arrays['nodes'], arrays['free_dofs'], M_free, K_free,
+                               c=case['c'], T=case['T']))
+        del M_free, K_free
+    finally:
+        arrays.clear()
+        for shm in blocks:
+            shm.close()
+    row['wall_time'] = time.perf_counter() - start
+    return row
+
+SWEEP_DEFAULTS = {'L': 1.0, 'T': 2, 'c': 1.0, 'Ne': 50, 'd': 2, 'point_distribution': 'uniform'}
+
+def parameter_sweep(grid, max_workers=None, csv_path=None):
+    """
+    Run the bar simulation for every combination of the parameter lists
+    in grid (e.g. {'c': [0.5, 1, 2], 'Ne': [50, 100], 'd': [1, 2]}; missing
+    parameters take the run_simulation defaults), or for every dict of a
+    list of cases, in a pool of worker processes.
+    Cases on the same mesh (L, Ne, d, point_distribution) share one assembled M and K through
+    multiprocessing.shared_memory. Return one row (dict) of parameters and
+    metrics (max_displacement, energy_drift, dt, Nt, wall_time) per case,
+    also written to csv_path if given.
+    """
+    if isinstance(grid, dict):
+        keys = list(grid)
+        cases = [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+    else:
+        cases = list(grid)
+    cases = [dict(SWEEP_DEFAULTS, **case) for case in cases]
+
+    blocks, specs = [], {}
+    try:
+        for case in cases:
+            mesh = (case['L'], case['Ne'], case['d'], case['point_distribution'])
+            if mesh in specs:
+                continue
+            nodes, free_dofs, M_free, K_free = bar_matrices(*mesh)
+            specs[mesh] = {}
+            for key, array in [('nodes', nodes), ('free_dofs', free_dofs),
+                               ('M_data', M_free.data), ('M_indices', M_free.indices),
+                               ('M_indptr', M_free.indptr), ('K_data', K_free.data),
+                               ('K_indices', K_free.indices), ('K_indptr', K_free.indptr)]:
+                shm, specs[mesh][key] = _share(array)
+                blocks.append(shm)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_sweep_case, case, specs[(case['L'], case['Ne'], case['d'],
+                                                             case['point_distribution'])])
+                       for case in cases]
+            rows = [future.result() for future in futures]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    if csv_path is not None:
+        with open(csv_path, 'w', newline='') as table:
+            writer = csv.DictWriter(table, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
 
 if __name__ == "__main__":
     run_simulation()
@@ -1,5 +1,10 @@
+import functools
+import hashlib
 import sympy as sym
 import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
 sym.init_printing()
 def basis(d,point_distribution='uniform',symbolic=False):
     """
@@ -7,8 +12,18 @@ def basis(d,point_distribution='uniform',symbolic=False):
     in a 1D element with d+1 nodes.
     If symbolic=True, return expressions as sympy expressions, else return Python
     functions of X.
-    point_distribution can be 'uniform' or 'Chebyshev'.
+    point_distribution can be 'uniform', 'Chebyshev' or 'GLL'
+    (Gauss-Lobatto-Legendre).
+    The functions are built once per (d, point_distribution, symbolic) and
+    shared by later calls; use tabulate_basis to evaluate them on arrays.
     """
+    return list(_basis(d, point_distribution, symbolic))
+
+# (d, point_distribution) of every numeric basis handed out by basis()
+_BASIS_KEYS = {}
+
+@functools.lru_cache(maxsize=None)
+def _basis(d, point_distribution, symbolic):
     X=sym.Symbol('X')
     if d==0:
         phi_sym=[1]
@@ -23,10 +38,40 @@ def basis(d,point_distribution='uniform',symbolic=False):
         elif point_distribution=='Chebyshev':
             # Just numeric nodes
             nodes=Chebyshev_nodes(-1,1,d)
+        elif point_distribution=='GLL':
+            nodes=list(gauss_lobatto(d+1)[0])
         phi_sym=[Lagrange_polynomials(X,r,nodes) for r in range(d+1)]
+    if symbolic:
+        return tuple(phi_sym)
     # Transform to python functions
-    phi_num=[sym.lambdify([X],phi_sym[r], modules='numpy') for r in range(d+1)]
-    return phi_sym if symbolic else phi_num
+    phi_num=tuple(sym.lambdify([X],phi_sym[r], modules='numpy') for r in range(d+1))
+    _BASIS_KEYS[phi_num] = (d, point_distribution)
+    return phi_num
+
+@functools.lru_cache(maxsize=32)
+def _lagrange_coefficients(d, point_distribution='uniform'):
+    """Monomial coefficients of the Lagrange basis, one row per function."""
+    nodes = _reference_nodes(d, point_distribution)
+    coeffs = np.linalg.inv(np.vander(nodes, d+1, increasing=True)).T
+    coeffs.flags.writeable = False
+    return coeffs
+
+def tabulate_basis(d, X, point_distribution='uniform', derivative=0):
+    """
+    Evaluate all d+1 local basis functions (or their derivative of the
+    given order with respect to X) at the reference points X in one
+    vectorized call. Return a (d+1, len(X)) float array whose row r
+    holds phi_r(X).
+    """
+    coeffs = _lagrange_coefficients(d, point_distribution)
+    if derivative:
+        coeffs = np.polynomial.polynomial.polyder(coeffs, derivative, axis=1)
+    return np.polynomial.polynomial.polyval(np.asarray(X, dtype=float), coeffs.T)
+
+def Chebyshev_nodes(a, b, N):
+    """Return the N+1 Chebyshev nodes on [a, b]."""
+    from math import cos, pi
+    return [0.5*(a+b) + 0.5*(b-a)*cos(float(2*i+1)/(2*(N+1))*pi) for i in range(N+1)]
 
 def Lagrange_polynomials(x,i,points):
     p=1
@@ -34,9 +79,260 @@ def Lagrange_polynomials(x,i,points):
         if k!=i:
             p*=(x-points[k])/(points[i]-points[k])
     return p
+
+@functools.lru_cache(maxsize=None)
+def gauss_legendre(n_q):
+    """
+    Return the n_q Gauss-Legendre points and weights on [-1, 1].
+    The rule integrates polynomials of degree 2*n_q-1 exactly.
+    """
+    X_q, w_q = np.polynomial.legendre.leggauss(n_q)
+    X_q.flags.writeable = False
+    w_q.flags.writeable = False
+    return X_q, w_q
+
+@functools.lru_cache(maxsize=None)
+def gauss_lobatto(n_q):
+    """
+    Return the n_q >= 2 Gauss-Lobatto-Legendre points and weights on
+    [-1, 1]. The end points are included and the rule integrates
+    polynomials of degree 2*n_q-3 exactly.
+    """
+    P = np.polynomial.legendre.Legendre.basis(n_q - 1)
+    X_q = np.concatenate(([-1.0], np.sort(P.deriv().roots().real), [1.0]))
+    w_q = 2.0 / (n_q * (n_q - 1) * P(X_q)**2)
+    X_q.flags.writeable = False
+    w_q.flags.writeable = False
+    return X_q, w_q
+
+def _is_numeric(values):
+    """True if all values can be turned into floats (no free symbols)."""
+    try:
+        for v in values:
+            float(v)
+    except TypeError:
+        return False
+    return True
+
+def _basis_coefficients(phi):
+    """
+    Return the monomial coefficients of the local basis functions phi,
+    one row per function. phi are polynomials of degree len(phi)-1, so
+    sampling them in len(phi) points recovers them exactly.
+    """
+    n = len(phi)
+    X = sym.Symbol('X')
+    X_s = np.linspace(-1, 1, n)
+    values = np.empty((n, n))
+    for r in range(n):
+        phi_r = phi[r] if callable(phi[r]) else sym.lambdify([X], phi[r], modules='numpy')
+        values[r] = np.broadcast_to(np.asarray(phi_r(X_s), dtype=float), X_s.shape)
+    return np.linalg.solve(np.vander(X_s, n, increasing=True), values.T).T
+
+def _tabulate(phi, X_q):
+    """Return phi_r(X_q) and dphi_r/dX(X_q) as (len(phi), len(X_q)) arrays."""
+    key = _reference_key(phi)
+    if key is not None:
+        d, point_distribution = key
+        return (tabulate_basis(d, X_q, point_distribution),
+                tabulate_basis(d, X_q, point_distribution, derivative=1))
+    coeffs = _basis_coefficients(phi)
+    dcoeffs = np.polynomial.polynomial.polyder(coeffs, axis=1)
+    P = np.polynomial.polynomial
+    return P.polyval(X_q, coeffs.T), P.polyval(X_q, dcoeffs.T)
+
+@functools.lru_cache(maxsize=32)
+def _lambdify_x(f):
+    x = sym.Symbol('x')
+    return sym.lambdify([x], f, modules='numpy')
+
+def _polynomial_degree(f):
+    """Degree of f in x, or None if f is not a polynomial."""
+    x = sym.Symbol('x')
+    if callable(f) and not hasattr(f, 'subs'):
+        try:
+            f = f(x)
+        except Exception:
+            return None
+    f = sym.sympify(f)
+    if not f.is_polynomial(x):
+        return None
+    return sym.degree(f, x) if f.has(x) else 0
+
+@functools.lru_cache(maxsize=32)
+def _lambdify_xt(f):
+    x, t = sym.symbols('x t')
+    return sym.lambdify([x, t], f, modules='numpy')
+
+def _load_quadrature_order(f, n):
+    """Gauss points for int f*phi_r: exact for polynomial f, else n+4."""
+    degree = _polynomial_degree(f)
+    return n + 4 if degree is None else (degree + n) // 2 + 1
+
+def _is_numeric_function(f):
+    """
+    True if f can be evaluated as floats by _evaluate: a number, a sympy
+    expression with no free symbol but x, or a callable returning floats
+    on an array. Other f (free parameters, callables building sympy
+    expressions) are left to the sympy integration.
+    """
+    if f is None:
+        return True
+    if hasattr(f, 'subs'):
+        return f.free_symbols <= {sym.Symbol('x')}
+    if callable(f):
+        try:
+            np.asarray(f(np.array([0.25, 0.5])), dtype=float)
+        except (TypeError, ValueError, AttributeError):
+            return False
+        return True
+    return _is_numeric([f])
+
+def _evaluate(f, x_q, t=None):
+    """
+    Evaluate f (sympy expression, callable or constant) at the points x_q,
+    and at the time t if t is given (f(x, t) for callables, the symbol t
+    for sympy expressions).
+    """
+    if hasattr(f, 'subs'):
+        values = _lambdify_x(f)(x_q) if t is None else _lambdify_xt(f)(x_q, t)
+    elif callable(f):
+        values = f(x_q) if t is None else f(x_q, t)
+    else:
+        values = f
+    return np.broadcast_to(np.asarray(values, dtype=float), np.shape(x_q))
  
+def _reference_nodes(d, point_distribution='uniform'):
+    if d == 0:
+        return np.zeros(1)
+    if point_distribution == 'uniform':
+        return np.linspace(-1, 1, d+1)
+    elif point_distribution == 'Chebyshev':
+        return np.array(Chebyshev_nodes(-1, 1, d))
+    elif point_distribution == 'GLL':
+        return np.array(gauss_lobatto(d+1)[0])
+    raise ValueError('unknown point_distribution %r' % point_distribution)
+
+def interpolation_nodes(a, b, N, point_distribution='uniform'):
+    """
+    Return the N+1 interpolation nodes on [a, b], in increasing order,
+    for point_distribution 'uniform', 'Chebyshev' or 'GLL'.
+    """
+    X = np.sort(_reference_nodes(N, point_distribution))
+    return a + (b - a) / 2 * (X + 1)
+
+@functools.lru_cache(maxsize=32)
+def _barycentric_weights(nodes):
+    x = np.array(nodes)
+    diff = x[:, None] - x[None, :]
+    np.fill_diagonal(diff, 1.0)
+    if len(x) > 1:
+        # Scale the differences by 4/(b-a) to keep the products in range
+        diff *= 4.0 / (x.max() - x.min())
+    w = 1.0 / np.prod(diff, axis=1)
+    w /= np.abs(w).max()
+    w.flags.writeable = False
+    return w
+
+def barycentric_weights(nodes):
+    """
+    Return the barycentric weights w_j = 1/prod_{k != j}(x_j - x_k) of the
+    nodes (up to a common factor), computed once per node set in O(N^2).
+    """
+    return _barycentric_weights(tuple(np.asarray(nodes, dtype=float).tolist()))
+
+def barycentric_interpolate(nodes, values, x):
+    """
+    Evaluate the polynomial interpolating values at the nodes (one value,
+    or one row of values, per node) at the points x with the barycentric
+    formula p(x) = sum(w_j f_j/(x-x_j)) / sum(w_j/(x-x_j)): O(N) per point
+    and no linear system, stable for Chebyshev and GLL nodes.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    values = np.asarray(values, dtype=float)
+    x = np.asarray(x, dtype=float)
+    w = barycentric_weights(nodes)
+    diff = x.reshape(-1, 1) - nodes
+    exact = diff == 0
+    diff[exact] = 1.0
+    C = w / diff
+    p = (C @ values) / C.sum(axis=1).reshape((-1,) + (1,) * (values.ndim - 1))
+    # Points that coincide with a node take its value
+    rows, cols = np.nonzero(exact)
+    p[rows] = values[cols]
+    return p.reshape(x.shape + values.shape[1:])
+
+@functools.lru_cache(maxsize=32)
+def reference_matrices(d, point_distribution='uniform'):
+    """
+    Return the mass, stiffness and convection matrices of the reference
+    element [-1, 1] for the basis of degree d:
+    M[r,s] = int phi_r phi_s dX, K[r,s] = int phi_r' phi_s' dX and
+    C[r,s] = int phi_r phi_s' dX.
+    On an element of length h the matrices are h/2*M, 2/h*K and C.
+    """
+    # d+1 points integrate every product (degree <= 2d) exactly
+    X_q, w_q = gauss_legendre(d+1)
+    phi_q = tabulate_basis(d, X_q, point_distribution)
+    dphi_q = tabulate_basis(d, X_q, point_distribution, derivative=1)
+    M = (phi_q * w_q) @ phi_q.T
+    K = (dphi_q * w_q) @ dphi_q.T
+    C = (phi_q * w_q) @ dphi_q.T
+    for A in (M, K, C):
+        A.flags.writeable = False
+    return M, K, C
+
+def reference_lumped_mass(d, point_distribution='uniform', mass_lumping='row_sum'):
+    """
+    Return the diagonal of the lumped reference mass matrix.
+    mass_lumping='row_sum' sums the rows of the consistent matrix.
+    mass_lumping='gll' integrates the mass matrix with the nodal
+    Gauss-Lobatto-Legendre rule, which is diagonal (the GLL weights) when
+    the basis nodes are the GLL points, as for point_distribution='GLL'
+    (and for d <= 2 with uniform nodes).
+    """
+    if mass_lumping == 'row_sum':
+        return reference_matrices(d, point_distribution)[0].sum(axis=1)
+    elif mass_lumping == 'gll':
+        if d == 0:
+            return np.array([2.0])
+        X_q, w_q = gauss_lobatto(d+1)
+        if not np.allclose(_reference_nodes(d, point_distribution), X_q):
+            raise ValueError("GLL lumping needs a basis with nodes at the GLL points, "
+                             "use point_distribution='GLL'")
+        return np.array(w_q)
+    raise ValueError('unknown mass_lumping %r' % mass_lumping)
+
+def _reference_key(phi):
+    """
+    Return (d, point_distribution) if phi is one of the numeric bases
+    returned by basis(), else None.
+    """
+    d = len(phi) - 1
+    if not all(callable(phi_r) for phi_r in phi):
+        return None
+    key = _BASIS_KEYS.get(tuple(phi))
+    if key is not None:
+        return key
+    for point_distribution in ('uniform', 'Chebyshev', 'GLL'):
+        nodes = _reference_nodes(d, point_distribution)
+        values = np.array([np.broadcast_to(np.asarray(phi_r(nodes), dtype=float), nodes.shape)
+                           for phi_r in phi])
+        if np.allclose(values, np.eye(d+1)):
+            return d, point_distribution
+    return None
+
 def element_matrix(phi,Omega_e, symbolic=True):
     n=len(phi)
+    if not symbolic and _is_numeric(Omega_e):
+        h = float(Omega_e[1]) - float(Omega_e[0])
+        key = _reference_key(phi)
+        if key is not None:
+            return reference_matrices(*key)[0] * (h / 2)
+        # Gauss-Legendre with n points is exact for phi_r*phi_s (degree 2n-2)
+        X_q, w_q = gauss_legendre(n)
+        phi_q, _ = _tabulate(phi, X_q)
+        return (phi_q * w_q) @ phi_q.T * (h / 2)
     if symbolic:
         A_e=sym.zeros(n,n)
     else:
@@ -61,6 +357,12 @@ def element_matrix(phi,Omega_e, symbolic=True):
 
 def element_vector(f,phi,Omega_e, symbolic=True):
     n=len(phi)
+    if not symbolic and _is_numeric(Omega_e) and _is_numeric_function(f):
+        X_q, w_q = gauss_legendre(_load_quadrature_order(f, n))
+        phi_q, _ = _tabulate(phi, X_q)
+        a, b = float(Omega_e[0]), float(Omega_e[1])
+        f_q = _evaluate(f, a * (1 - X_q) / 2 + b * (1 + X_q) / 2)
+        return phi_q @ (f_q * w_q) * ((b - a) / 2)
     if symbolic:
         b_e=sym.zeros(n,1)
     else:
@@ -103,6 +405,15 @@ def element_vector(f,phi,Omega_e, symbolic=True):
 
 def element_stiffness_matrix(phi, Omega_e, symbolic=True):
     n = len(phi)
+    if not symbolic and _is_numeric(Omega_e):
+        h = float(Omega_e[1]) - float(Omega_e[0])
+        key = _reference_key(phi)
+        if key is not None:
+            return reference_matrices(*key)[1] * (2 / h)
+        # dphi_r*dphi_s has degree 2n-4, n-1 points are enough
+        X_q, w_q = gauss_legendre(max(n - 1, 1))
+        _, dphi_q = _tabulate(phi, X_q)
+        return (dphi_q * w_q) @ dphi_q.T * (2 / h)
     if symbolic:
         K_e = sym.zeros(n, n)
     else:
@@ -137,23 +448,131 @@ def element_stiffness_matrix(phi, Omega_e, symbolic=True):
             K_e[s, r] = K_e[r, s]
     return K_e
 
+def element_convection_matrix(phi, Omega_e, symbolic=True):
+    n = len(phi)
+    if not symbolic and _is_numeric(Omega_e):
+        key = _reference_key(phi)
+        if key is not None:
+            return reference_matrices(*key)[2].copy()
+        X_q, w_q = gauss_legendre(n)
+        phi_q, dphi_q = _tabulate(phi, X_q)
+        return (phi_q * w_q) @ dphi_q.T
+    if symbolic:
+        C_e = sym.zeros(n, n)
+    else:
+        C_e = np.zeros((n, n), dtype=object)
+
+    X = sym.Symbol('X')
+    # Integral of phi_r * dphi_s/dx * detJ dX = phi_r * dphi_s/dX dX,
+    # independent of the element size
+    for r in range(n):
+        phi_r = phi[r](X) if callable(phi[r]) else phi[r]
+        for s in range(n):
+            phi_s = phi[s](X) if callable(phi[s]) else phi[s]
+            C_e[r, s] = sym.integrate(phi_r * sym.diff(phi_s, X), (X, -1, 1))
+    return C_e
+
+# Reference matrix index and power of h/2 for the element routines that
+# are a scaled copy of a reference_matrices() entry
+_REFERENCE_SCALING = {
+    element_matrix: (0, 1),
+    element_stiffness_matrix: (1, -1),
+    element_convection_matrix: (2, 0),
+}
+
+# End points of a generic element in the parametric element forms
+_ELEMENT_ENDS = (sym.Dummy('x0'), sym.Dummy('x1'))
+
+@functools.lru_cache(maxsize=32)
+def _parametric_element(phi, f, matrix_function):
+    """
+    Integrate the element matrix and vector once on the generic element
+    [x0, x1] and return them simplified as sympy matrices in x0, x1 and
+    the element size h. phi must be a tuple.
+    """
+    A_e = sym.Matrix(matrix_function(list(phi), list(_ELEMENT_ENDS), symbolic=True))
+    A_e = A_e.applyfunc(sym.factor)
+    b_e = None
+    if f is not None:
+        b_e = sym.Matrix(element_vector(f, list(phi), list(_ELEMENT_ENDS), symbolic=True))
+        b_e = b_e.applyfunc(sym.factor)
+    return A_e, b_e
+
+def _vectorized_kernel(M, shape):
+    """
+    Compile the sympy matrix M(x0, x1) into a NumPy function of arrays of
+    end points returning an (N_e,) + shape array.
+    """
+    func = sym.lambdify(_ELEMENT_ENDS, list(M), modules='numpy', cse=True)
+    def kernel(x0, x1):
+        x0, x1 = np.broadcast_arrays(np.asarray(x0, dtype=float), np.asarray(x1, dtype=float))
+        entries = [np.broadcast_to(np.asarray(v, dtype=float), x0.shape) for v in func(x0, x1)]
+        return np.stack(entries, axis=-1).reshape(x0.shape + shape)
+    return kernel
+
+@functools.lru_cache(maxsize=32)
+def _compiled_kernels(phi, f, matrix_function):
+    A_e, b_e = _parametric_element(phi, f, matrix_function)
+    h = sym.Symbol('h')
+    x0, x1 = _ELEMENT_ENDS
+    n = len(phi)
+    A_kernel = _vectorized_kernel(A_e.subs(h, x1 - x0), (n, n))
+    b_kernel = None if b_e is None else _vectorized_kernel(b_e.subs(h, x1 - x0), (n,))
+    return A_kernel, b_kernel
+
+def compile_element_kernels(phi, f=None, matrix_function=element_matrix):
+    """
+    Derive the element matrix (and the element vector if f is given) once
+    in closed form on a generic element [x0, x1] and compile it with
+    common-subexpression elimination into vectorized NumPy kernels.
+    Return (A_kernel, b_kernel): A_kernel(x0, x1) gives the (N_e, n, n)
+    element matrices for arrays of element end points, b_kernel(x0, x1)
+    the (N_e, n) element vectors (None if f is None).
+    f must be a sympy expression in x (or a function accepting one).
+    """
+    return _compiled_kernels(tuple(phi), f, matrix_function)
+
 def assemble(nodes, elements, phi, f, symbolic=True, matrix_function=element_matrix):
     N_n, N_e = len(nodes), len(elements)
+    # Numeric element routines return float64 arrays on numeric meshes,
+    # the load vector only if f has no free parameter either
+    dtype = float if _is_numeric(nodes) else object
+    b_dtype = dtype if _is_numeric_function(f) else object
     if symbolic:
         A = sym.zeros(N_n, N_n)
         b = sym.zeros(N_n, 1)
     else:
-        A = np.zeros((N_n, N_n), dtype=object)
-        b = np.zeros(N_n, dtype=object)
+        A = np.zeros((N_n, N_n), dtype=dtype)
+        b = np.zeros(N_n, dtype=b_dtype)
+    # On numeric meshes the known element matrices are scaled copies of
+    # the cached reference matrix, so no integration is done per element
+    ref = None
+    if not symbolic and dtype is float and matrix_function in _REFERENCE_SCALING:
+        key = _reference_key(phi)
+        if key is not None:
+            index, power = _REFERENCE_SCALING[matrix_function]
+            ref = reference_matrices(*key)[index]
+    # Symbolic element forms are integrated once on a generic element
+    # and only substituted per element
+    if symbolic:
+        A_p, b_p = _parametric_element(tuple(phi), f, matrix_function)
     for e in range(N_e):
         Omega_e = [nodes[elements[e][0]], nodes[elements[e][-1]]]
-        A_e = matrix_function(phi, Omega_e, symbolic=symbolic)
+        if symbolic:
+            ends = dict(zip(_ELEMENT_ENDS, Omega_e))
+            A_e = A_p.subs(ends)
+        elif ref is not None:
+            A_e = ref * ((Omega_e[1] - Omega_e[0]) / 2)**power
+        else:
+            A_e = matrix_function(phi, Omega_e, symbolic=symbolic)
         
         # Only compute load vector if f is provided (not None)
-        if f is not None:
+        if f is not None and symbolic:
+            b_e = b_p.subs(ends)
+        elif f is not None:
             b_e = element_vector(f, phi, Omega_e, symbolic=symbolic)
         else:
-            b_e = sym.zeros(len(phi), 1) if symbolic else np.zeros(len(phi), dtype=object)
+            b_e = sym.zeros(len(phi), 1) if symbolic else np.zeros(len(phi), dtype=b_dtype)
 
         for r in range(len(elements[e])):
             for s in range(len(elements[e])):
@@ -161,18 +580,314 @@ def assemble(nodes, elements, phi, f, symbolic=True, matrix_function=element_mat
             if f is not None:
                 b[elements[e][r]] += b_e[r]
     return A, b
-def compute_solution(A,b,symbolic=True):
+def element_matrices(phi, nodes, elements, matrix_function=element_matrix):
+    """
+    Return the element matrices of all elements of a numeric mesh as one
+    (N_e, n, n) float array. Matrices that are not a scaled reference
+    matrix are evaluated with the kernel from compile_element_kernels.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    elements = np.asarray(elements)
+    h = nodes[elements[:, -1]] - nodes[elements[:, 0]]
+    key = _reference_key(phi)
+    if matrix_function in _REFERENCE_SCALING and key is not None:
+        index, power = _REFERENCE_SCALING[matrix_function]
+        return reference_matrices(*key)[index] * ((h / 2)**power)[:, None, None]
+    A_kernel, _ = compile_element_kernels(phi, matrix_function=matrix_function)
+    return A_kernel(nodes[elements[:, 0]], nodes[elements[:, -1]])
+
+def _scatter(elements, A_e, N_n):
+    """Sum the (N_e, n, n) element matrices A_e into an N_n x N_n CSR matrix."""
+    n = elements.shape[1]
+    rows = np.repeat(elements, n, axis=1).ravel()
+    cols = np.tile(elements, (1, n)).ravel()
+    # Duplicate (row, col) entries are summed by the COO -> CSR conversion
+    return scipy.sparse.coo_matrix((A_e.ravel(), (rows, cols)), shape=(N_n, N_n)).tocsr()
+
+def assemble_sparse(nodes, elements, phi, f=None, matrix_function=element_matrix,
+                    compiled=False, mass_lumping=None):
+    """
+    Batched version of assemble for numeric meshes. All element matrices
+    are computed at once and summed into a scipy.sparse CSR matrix, so
+    memory is O(N_e*n**2) instead of O(N_n**2).
+    With compiled=True the element matrices and vectors are evaluated
+    with the closed-form kernels of compile_element_kernels.
+    mass_lumping ('row_sum' or 'gll', see reference_lumped_mass) lumps the
+    mass matrix, and A is then returned as the vector of its diagonal.
+    Return the CSR matrix A and the float load vector b.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    elements = np.asarray(elements)
+    N_n = len(nodes)
+    if compiled:
+        A_kernel, b_kernel = compile_element_kernels(phi, f, matrix_function)
+        x0, x1 = nodes[elements[:, 0]], nodes[elements[:, -1]]
+        A = _scatter(elements, A_kernel(x0, x1), N_n)
+        b = np.zeros(N_n)
+        if f is not None:
+            b = np.bincount(elements.ravel(), weights=b_kernel(x0, x1).ravel(), minlength=N_n)
+        return A, b
+    b = np.zeros(N_n) if f is None else load_vector(f, phi, nodes, elements)
+    if mass_lumping is not None:
+        if matrix_function is not element_matrix:
+            raise ValueError('mass_lumping only applies to element_matrix')
+        key = _reference_key(phi)
+        h = nodes[elements[:, -1]] - nodes[elements[:, 0]]
+        if key is not None:
+            m_e = np.outer(h / 2, reference_lumped_mass(*key, mass_lumping=mass_lumping))
+        elif mass_lumping == 'row_sum':
+            m_e = element_matrices(phi, nodes, elements).sum(axis=2)
+        else:
+            raise ValueError('GLL lumping needs a basis from basis()')
+        return np.bincount(elements.ravel(), weights=m_e.ravel(), minlength=N_n), b
+    A = _scatter(elements, element_matrices(phi, nodes, elements, matrix_function), N_n)
+    return A, b
+
+def load_vector(f, phi, nodes, elements, t=None, n_q=None):
+    """
+    Return the global load vector b_i = int f phi_i dx on a numeric mesh.
+    The Gauss points of all elements are mapped to physical space as one
+    (N_e, n_q) array, f is evaluated once on it (sympy expressions are
+    lambdified, f(x, t) is used when t is given) and contracted with the
+    tabulated basis. n_q defaults to the order used by element_vector.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    elements = np.asarray(elements)
+    if n_q is None:
+        n_q = _load_quadrature_order(f, len(phi))
+    X_q, w_q = gauss_legendre(n_q)
+    phi_q, _ = _tabulate(phi, X_q)
+    x0, x1 = nodes[elements[:, 0]], nodes[elements[:, -1]]
+    x_q = x0[:, None] * (1 - X_q) / 2 + x1[:, None] * (1 + X_q) / 2
+    f_q = _evaluate(f, x_q, t)
+    b_e = np.einsum('eq,q,rq->er', f_q, w_q, phi_q) * ((x1 - x0) / 2)[:, None]
+    return np.bincount(elements.ravel(), weights=b_e.ravel(), minlength=len(nodes))
+
+def _element_action(nodes, elements, phi, matrix_function):
+    """
+    Return a function applying the global matrix to a vector or a block of
+    vectors without forming it: gather the element values, apply the
+    element matrices with einsum and scatter-add the result.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    elements = np.asarray(elements)
+    N_n = len(nodes)
+    key = _reference_key(phi)
+    if matrix_function in _REFERENCE_SCALING and key is not None:
+        # Only the reference matrix and one scale per element are stored
+        index, power = _REFERENCE_SCALING[matrix_function]
+        ref = reference_matrices(*key)[index]
+        scale = ((nodes[elements[:, -1]] - nodes[elements[:, 0]]) / 2)**power
+        def element_products(u_e):
+            return np.einsum('rs,es...->er...', ref, u_e) * scale.reshape((-1,) + (1,)*(u_e.ndim - 1))
+    else:
+        A_e = element_matrices(phi, nodes, elements, matrix_function)
+        def element_products(u_e):
+            return np.einsum('ers,es...->er...', A_e, u_e)
+    index = elements.ravel()
+    def apply(u):
+        y_e = element_products(u[elements])
+        if u.ndim == 1:
+            return np.bincount(index, weights=y_e.ravel(), minlength=N_n)
+        y_e = y_e.reshape(len(index), -1)
+        return np.column_stack([np.bincount(index, weights=y_e[:, k], minlength=N_n)
+                                for k in range(y_e.shape[1])])
+    return apply
+
+def matrix_free_operator(nodes, elements, phi, matrix_function=element_matrix, free_dofs=None):
+    """
+    Return the global matrix of matrix_function as a matrix-free
+    scipy.sparse.linalg.LinearOperator. Only the reference matrix and the
+    element sizes are stored, so memory is that of a few vectors.
+    If free_dofs is given the operator acts on those degrees of freedom
+    only (the others are held at zero).
+    """
+    N_n = len(nodes)
+    n_dofs = N_n
+    apply = _element_action(nodes, elements, phi, matrix_function)
+    if free_dofs is not None:
+        free_dofs = np.asarray(free_dofs)
+        apply_all = apply
+        def apply(u):
+            full = np.zeros((N_n,) + u.shape[1:])
+            full[free_dofs] = u
+            return apply_all(full)[free_dofs]
+        n_dofs = len(free_dofs)
+    def matmat(U):
+        return apply(np.asarray(U, dtype=float))
+    def matvec(u):
+        return apply(np.asarray(u, dtype=float).ravel())
+    # The mass and stiffness forms are symmetric, so rmatvec = matvec
+    return scipy.sparse.linalg.LinearOperator((n_dofs, n_dofs), matvec=matvec, rmatvec=matvec,
+                                              matmat=matmat, dtype=float)
+
+def mass_operator(nodes, elements, phi, free_dofs=None):
+    return matrix_free_operator(nodes, elements, phi, element_matrix, free_dofs)
+
+def stiffness_operator(nodes, elements, phi, free_dofs=None):
+    return matrix_free_operator(nodes, elements, phi, element_stiffness_matrix, free_dofs)
+
+def matrix_free_diagonal(nodes, elements, phi, matrix_function=element_matrix, free_dofs=None):
+    """
+    Diagonal of the global matrix, e.g. for a Jacobi preconditioner. For a
+    basis from basis() only the diagonal of the reference matrix is scaled
+    per element; the element matrices are formed for other bases.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    elements = np.asarray(elements)
+    key = _reference_key(phi)
+    if matrix_function in _REFERENCE_SCALING and key is not None:
+        index, power = _REFERENCE_SCALING[matrix_function]
+        scale = ((nodes[elements[:, -1]] - nodes[elements[:, 0]]) / 2)**power
+        d_e = np.outer(scale, np.diag(reference_matrices(*key)[index]))
+    else:
+        d_e = np.diagonal(element_matrices(phi, nodes, elements, matrix_function), axis1=1, axis2=2)
+    diag = np.bincount(elements.ravel(), weights=d_e.ravel(), minlength=len(nodes))
+    return diag if free_dofs is None else diag[free_dofs]
+
+def mesh_hash(nodes, elements, *parameters):
+    """
+    Hex digest of the node coordinates, the connectivity and any extra
+    parameters (degree, wave speed, ...), used as a per-mesh cache key.
+    """
+    nodes = np.ascontiguousarray(nodes, dtype=float)
+    elements = np.ascontiguousarray(elements, dtype=np.int64)
+    digest = hashlib.sha1()
+    digest.update(nodes.tobytes())
+    digest.update(elements.tobytes())
+    digest.update(repr((nodes.shape, elements.shape) + parameters).encode())
+    return digest.hexdigest()
+
+# Largest bandwidth solved with banded storage, and smallest number of
+# unknowns for which 'auto' prefers CG over a direct sparse solver on
+# symmetric matrices that are not banded
+MAX_BANDWIDTH = 10
+CG_THRESHOLD = 200000
+
+def bandwidth(A):
+    """Return the lower and upper bandwidth of a dense or sparse matrix."""
+    if scipy.sparse.issparse(A):
+        A = A.tocoo()
+        offsets = (A.col - A.row)[A.data != 0]
+    else:
+        rows, cols = np.nonzero(A)
+        offsets = cols - rows
+    if len(offsets) == 0:
+        return 0, 0
+    return max(-offsets.min(), 0), max(offsets.max(), 0)
+
+def _is_symmetric(A, lower, upper, rtol=1e-12):
+    if lower != upper:
+        return False
+    scale = abs(A).max() if scipy.sparse.issparse(A) else np.abs(A).max()
+    if upper <= MAX_BANDWIDTH:
+        # Compare the few stored diagonals instead of forming A - A^T
+        return all(np.allclose(A.diagonal(k), A.diagonal(-k), rtol=0, atol=rtol*scale)
+                   for k in range(1, upper+1))
+    if scipy.sparse.issparse(A):
+        return abs(A - A.T).max() <= rtol*scale
+    return np.allclose(A, A.T, rtol=0, atol=rtol*scale)
+
+def _banded(A, lower, upper):
+    """Return A in the LAPACK banded storage ab[upper + i - j, j] = A[i, j]."""
+    n = A.shape[0]
+    ab = np.zeros((lower + upper + 1, n))
+    for k in range(-lower, upper+1):
+        diag = A.diagonal(k)
+        if k >= 0:
+            ab[upper - k, k:] = diag
+        else:
+            ab[upper - k, :n+k] = diag
+    return ab
+
+def _jacobi_preconditioner(A):
+    inv_diag = 1.0 / A.diagonal()
+    return scipy.sparse.linalg.LinearOperator(A.shape, matvec=lambda r: inv_diag * r, dtype=float)
+
+def _ilu_preconditioner(A):
+    ilu = scipy.sparse.linalg.spilu(scipy.sparse.csc_matrix(A))
+    return scipy.sparse.linalg.LinearOperator(A.shape, matvec=ilu.solve, dtype=float)
+
+def factorize(A, method='auto', preconditioner='jacobi', rtol=1e-10):
+    """
+    Factorize the numeric matrix A once and return a function solve(b)
+    for A x = b (b may hold several right-hand sides as columns).
+    method can be
+      'banded': banded Cholesky (solveh_banded) for symmetric positive
+                definite A, banded LU otherwise,
+      'sparse': sparse LU (SuperLU) of a CSR/CSC matrix,
+      'cg':     conjugate gradients with a 'jacobi' preconditioner;
+                preconditioner='ilu' uses an incomplete LU instead, which
+                is not symmetric, so the Krylov solver is then GMRES,
+      'dense':  dense LU,
+      'auto':   choose from the bandwidth, symmetry and size of A.
+    """
+    n = A.shape[0]
+    lower, upper = bandwidth(A)
+    symmetric = _is_symmetric(A, lower, upper)
+    if method == 'auto':
+        if max(lower, upper) <= MAX_BANDWIDTH:
+            method = 'banded'
+        elif scipy.sparse.issparse(A):
+            method = 'cg' if symmetric and n >= CG_THRESHOLD else 'sparse'
+        else:
+            method = 'dense'
+
+    if method == 'banded':
+        if symmetric:
+            ab = _banded(A, 0, upper)
+            try:
+                cb = scipy.linalg.cholesky_banded(ab)
+                return lambda b: scipy.linalg.cho_solve_banded((cb, False), b)
+            except np.linalg.LinAlgError:
+                pass  # Not positive definite, use banded LU
+        ab = _banded(A, lower, upper)
+        return lambda b: scipy.linalg.solve_banded((lower, upper), ab, b)
+    elif method == 'sparse':
+        A = scipy.sparse.csc_matrix(A)
+        if symmetric:
+            # Symmetric ordering without pivoting keeps the Cholesky fill-in
+            lu = scipy.sparse.linalg.splu(A, permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0)
+        else:
+            lu = scipy.sparse.linalg.splu(A)
+        return lu.solve
+    elif method == 'cg':
+        A = scipy.sparse.csr_matrix(A)
+        if preconditioner == 'jacobi':
+            P = _jacobi_preconditioner(A)
+            krylov, name = scipy.sparse.linalg.cg, 'CG'
+        elif preconditioner == 'ilu':
+            # CG needs a symmetric positive definite preconditioner
+            P = _ilu_preconditioner(A)
+            krylov, name = scipy.sparse.linalg.gmres, 'GMRES'
+        else:
+            raise ValueError('unknown preconditioner %r' % preconditioner)
+        def solve(b):
+            b = np.asarray(b, dtype=float)
+            if b.ndim == 2:
+                return np.column_stack([solve(b[:, j]) for j in range(b.shape[1])])
+            x, info = krylov(A, b, rtol=rtol, M=P)
+            if info != 0:
+                raise np.linalg.LinAlgError('%s did not converge (info=%d)' % (name, info))
+            return x
+        return solve
+    elif method == 'dense':
+        A = A.toarray() if scipy.sparse.issparse(A) else np.asarray(A, dtype=float)
+        lu_piv = scipy.linalg.lu_factor(A)
+        return lambda b: scipy.linalg.lu_solve(lu_piv, b)
+    raise ValueError('unknown method %r' % method)
+
+def compute_solution(A,b,symbolic=True,method='auto'):
     if symbolic:
         c=A.LUsolve(b)
     else:
-        if hasattr(A, 'dtype') and A.dtype == object:
+        if hasattr(A, 'dtype') and A.dtype == object and not _is_numeric(np.ravel(A)):
             A_sym = sym.Matrix(A)
             b_sym = sym.Matrix(b)
             c = A_sym.LUsolve(b_sym)
             c = np.array(c).flatten()
         else:
-            c=np.linalg.solve(A,b)
+            if not scipy.sparse.issparse(A):
+                A = np.asarray(A, dtype=float)
+            c = factorize(A, method)(np.asarray(b, dtype=float))
     return c
-
-    
-    
\ No newline at end of file
@@ -1,4 +1,5 @@
 from test import *
+from fe_appprox1D import tabulate_basis
 # f1=sym.sin(.5*sym.pi*x)
 # f2=sym.sin(2*sym.pi*x)
 # phi=4*f1-.5*f2
@@ -22,16 +23,15 @@ num = 0  # Initialize counter outside loop
 
 for e in elements:
     points = [nodes[e[i]] for i in range(3)]
-    p_elem = [Lagrange_polynomials(x, i, points) for i in range(3)]
     xx = np.linspace(points[0], points[2], 101)  # Use element's actual range
-    P0 = sym.lambdify([x], p_elem[0])
-    P1 = sym.lambdify([x], p_elem[1])
-    P2 = sym.lambdify([x], p_elem[2])
+    # Map to the reference element and evaluate all three functions at once
+    X = 2 * (xx - points[0]) / (points[2] - points[0]) - 1
+    P = tabulate_basis(2, X)
     
     plt.subplot(2, 2, num+1)  # Create subplot for current element
-    plt.plot(xx, P0(xx), label='$\\phi_{}$'.format(e[0]))
-    plt.plot(xx, P1(xx), label='$\\phi_{}$'.format(e[1]))
-    plt.plot(xx, P2(xx), label='$\\phi_{}$'.format(e[2]))
+    plt.plot(xx, P[0], label='$\\phi_{}$'.format(e[0]))
+    plt.plot(xx, P[1], label='$\\phi_{}$'.format(e[1]))
+    plt.plot(xx, P[2], label='$\\phi_{}$'.format(e[2]))
     plt.legend()
     plt.title('Element {}'.format(num))
     plt.xlabel('x')
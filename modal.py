@@ -0,0 +1,60 @@
+"""
+Modal superposition for M u'' + C u' + K u = 0 with no damping or
+Rayleigh damping C = alpha*M + beta*K. The lowest k modes of (K, M) are
+computed once and u(t) is then evaluated in closed form at any time,
+without time stepping.
+"""
+import os
+import numpy as np
+import scipy.sparse.linalg
+
+def modes(K, M, k, cache_dir=None, key=None):
+    """
+    Lowest k eigenpairs of K phi = omega^2 M phi by shift-invert eigsh
+    (sigma=0, K must be nonsingular). Return omega (k,) and the
+    M-orthonormal mode shapes Phi (ndof, k).
+    With cache_dir and key (see mesh_hash), the modes are stored in
+    cache_dir/modes_<key>_<k>.npz and read back on the next call.
+    """
+    path = None
+    if cache_dir is not None and key is not None:
+        path = os.path.join(cache_dir, 'modes_%s_%d.npz' % (key, k))
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                return cached['omega'], cached['Phi']
+    omega2, Phi = scipy.sparse.linalg.eigsh(K, k=k, M=M, sigma=0, which='LM')
+    order = np.argsort(omega2)
+    omega, Phi = np.sqrt(omega2[order]), Phi[:, order]
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(path, omega=omega, Phi=Phi)
+    return omega, Phi
+
+def modal_response(omega, q0, dq0, t, alpha=0.0, beta=0.0):
+    """
+    Modal coordinates q(t) of shape (k, len(t)) for q'' + 2 zeta omega q'
+    + omega^2 q = 0, zeta = alpha/(2 omega) + beta omega/2, with initial
+    values q0 and velocities dq0. Overdamped modes are handled through
+    the complex damped frequency.
+    """
+    t = np.atleast_1d(np.asarray(t, dtype=float))[None, :]
+    omega = omega[:, None]
+    zeta = alpha / (2 * omega) + beta * omega / 2
+    omega_d = omega * np.sqrt(1 - zeta**2 + 0j)
+    cos = np.cos(omega_d * t).real
+    # sin(omega_d t)/omega_d, equal to t for critically damped modes
+    sin = (t * np.sinc(omega_d * t / np.pi)).real
+    decay = np.exp(-zeta * omega * t)
+    return decay * (q0[:, None] * cos + (dq0[:, None] + zeta * omega * q0[:, None]) * sin)
+
+def modal_solver(K, M, u0, v0, k=20, alpha=0.0, beta=0.0, cache_dir=None, key=None):
+    """
+    Project the initial conditions u0, v0 on the lowest k modes of (K, M)
+    and return a function u(t) giving the displacement (ndof, len(t)) at
+    the requested times, in O(k*ndof) per time.
+    alpha, beta are the Rayleigh damping coefficients (0 for no damping).
+    """
+    omega, Phi = modes(K, M, k, cache_dir, key)
+    q0 = Phi.T @ (M @ np.asarray(u0, dtype=float))
+    dq0 = Phi.T @ (M @ np.asarray(v0, dtype=float))
+    return lambda t: Phi @ modal_response(omega, q0, dq0, t, alpha, beta)
@@ -0,0 +1,123 @@
+"""
+Newmark-beta time integration of M a + C v + K u = f, the Python
+counterpart of codes_tp/Newmark2N.m and codes_tp/newmark1stepMRHS.m.
+Several load cases can be advanced together as the columns of a block.
+"""
+import os
+import numpy as np
+import scipy.sparse
+from fe_appprox1D import factorize, bandwidth, MAX_BANDWIDTH
+from checkpoint import checkpointer, load_checkpoint
+
+def effective_stiffness(M, C, K, dt, beta=0.25, gamma=0.5):
+    """fatK = K + M/(beta*dt^2) + gamma*C/(beta*dt)"""
+    fatK = K + 1/(beta*dt**2)*M
+    if C is not None:
+        fatK = fatK + gamma/(beta*dt)*C
+    return fatK
+
+def newmark_solver(fatK, ntime, fatK1=None):
+    """
+    Return a function solving fatK u = b for one or several right-hand
+    sides. As in Newmark2N.m, fatK is inverted explicitly when there are
+    more time steps than half the number of DOFs (2*ntime > ndof) and
+    factorized once otherwise. Banded matrices (1D meshes) are always
+    factorized: their triangular solves are cheaper than a dense product.
+    """
+    if fatK1 is not None:
+        return lambda b: fatK1 @ b
+    ndof = fatK.shape[0]
+    if 2*ntime > ndof and max(bandwidth(fatK)) > MAX_BANDWIDTH:
+        dense = fatK.toarray() if scipy.sparse.issparse(fatK) else np.asarray(fatK, dtype=float)
+        fatK1 = np.linalg.inv(dense)
+        return lambda b: fatK1 @ b
+    # Banded or sparse Cholesky-type factorization, done once
+    return factorize(fatK)
+
+def newmark_step(M, C, K, f, u0, v0, a0, dt, solve, beta=0.25, gamma=0.5):
+    """
+    Compute one Newmark step from (u0, v0, a0) with the load f at the new
+    time. solve(b) solves fatK u = b (see newmark_solver). The states may
+    be blocks with one column per load case.
+    """
+    b = f + M @ (1/(beta*dt**2)*u0 + 1/(beta*dt)*v0 + (1/(2*beta)-1)*a0)
+    if C is not None:
+        b = b + C @ (gamma/(beta*dt)*u0 + (gamma/beta-1)*v0 + dt/2*(gamma/beta-2)*a0)
+    u = solve(b)
+    a = 1/(beta*dt**2) * (u - u0 - dt*v0 - dt**2/2*(1-2*beta)*a0)
+    v = v0 + dt*((1-gamma)*a0 + gamma*a)
+    return u, v, a
+
+def newmark(M, C, K, f, u0, v0, dt, beta=0.25, gamma=0.5, fatK1=None,
+            checkpoint_path=None, checkpoint_every=None, checkpoint_seconds=None,
+            resume=False, key='', history_path=None):
+    """
+    Solve M a + C v + K u = f with the Newmark scheme (C may be None).
+
+    f is the loading, of shape (ndof, ntime) for one load case or
+    (ndof, ntime, nrhs) for a block of nrhs load cases, and u0, v0 are the
+    initial displacement and velocity ((ndof,) or (ndof, nrhs)).
+    fatK = K + M/(beta*dt^2) + gamma*C/(beta*dt) is factorized once and
+    every step solves all load cases at once as a 2D right-hand side.
+    fatK1 is an optional precomputed inverse of fatK.
+    With checkpoint_path, the last state (u, v, a), the step index and dt
+    are saved atomically every checkpoint_every steps and/or
+    checkpoint_seconds seconds, together with key (e.g. a mesh_hash);
+    resume=True continues from that checkpoint bit for bit. The histories
+    are then written step by step to the .npy file history_path (default:
+    next to checkpoint_path), of shape (3, ntime, ndof[, nrhs]) and
+    flushed before each checkpoint.
+    Return u, v, a with the shape of f.
+    """
+    if resume and checkpoint_path is None:
+        raise ValueError('resume=True needs checkpoint_path')
+    f = np.asarray(f, dtype=float)
+    ndof, ntime = f.shape[:2]
+    block = f.shape[2:]
+
+    if checkpoint_path is not None:
+        if history_path is None:
+            history_path = os.path.splitext(checkpoint_path)[0] + '_history.npy'
+        if resume:
+            history = np.lib.format.open_memmap(history_path, mode='r+')
+        else:
+            history = np.lib.format.open_memmap(history_path, mode='w+', dtype=float,
+                                                shape=(3, ntime, ndof) + block)
+        # Time-major on disk, so that each step writes contiguous rows
+        u, v, a = (np.swapaxes(h, 0, 1) for h in history)
+    else:
+        u = np.zeros(f.shape)
+        v = np.zeros(f.shape)
+        a = np.zeros(f.shape)
+
+    # One initial state may be shared by all load cases
+    up = np.broadcast_to(np.asarray(u0, dtype=float).T, block[::-1] + (ndof,)).T
+    vp = np.broadcast_to(np.asarray(v0, dtype=float).T, block[::-1] + (ndof,)).T
+    r0 = f[:, 0] - K @ up
+    if C is not None:
+        r0 = r0 - C @ vp
+    ap = factorize(M)(r0)
+
+    fatK = effective_stiffness(M, C, K, dt, beta, gamma)
+    solve = newmark_solver(fatK, ntime, fatK1)
+
+    u[:, 0] = up; v[:, 0] = vp; a[:, 0] = ap
+    i0 = 1
+    if resume:
+        state = load_checkpoint(checkpoint_path, key)
+        if float(state['dt']) != dt:
+            raise ValueError('checkpoint %s was written with dt=%g' % (checkpoint_path, state['dt']))
+        i0 = int(state['n']) + 1
+        up, vp, ap = state['u'], state['v'], state['a']
+
+    save = None
+    if checkpoint_path is not None and (checkpoint_every or checkpoint_seconds):
+        save = checkpointer(checkpoint_path, checkpoint_every, checkpoint_seconds, history.flush)
+    for i in range(i0, ntime):
+        up, vp, ap = newmark_step(M, C, K, f[:, i], up, vp, ap, dt, solve, beta, gamma)
+        u[:, i] = up; v[:, i] = vp; a[:, i] = ap
+        if save is not None:
+            save(i, u=up, v=vp, a=ap, dt=dt, mesh_hash=key)
+    if checkpoint_path is not None:
+        history.flush()
+    return u, v, a
@@ -1,65 +1,135 @@
+import functools
+import os
 import sympy as sym
 import numpy as np
 from numpy import linspace, tanh, pi, sin
 import matplotlib.pyplot as plt
 import scipy.integrate
+import scipy.special
+import scipy.fft
+from fe_appprox1D import barycentric_interpolate
 
-def least_square(f, psi, Omega):
+def least_square(f, psi, Omega, method='auto', n_q=None):
+    """
+    Least squares approximation of the sympy expression f by the sympy
+    basis psi on Omega. Return u (sympy) and c (sympy Matrix).
+    method='symbolic' integrates every entry with sympy.integrate.
+    method='auto' integrates exactly with Poly when f and psi are
+    polynomials in x and Omega is numeric; otherwise all the integrals
+    are computed at once with lambdified Gauss-Legendre quadrature (see
+    gram_system), on n_q points or doubling from 2(N+1)+32 points until c
+    no longer changes, and the system is solved numerically. It falls
+    back to 'symbolic' when f, psi or Omega contain symbols other than x.
+    """
     N = len(psi) - 1
-    A = sym.zeros(N + 1, N + 1)
-    b = sym.zeros(N + 1, 1)
     x = sym.Symbol('x')
-    for i in range(N + 1):
-        for j in range(i, N + 1):
-            A[i, j] = sym.integrate(psi[i] * psi[j], (x, Omega[0], Omega[1]))
-            A[j, i] = A[i, j]  # Symmetric matrix
-        b[i, 0] = sym.integrate(f * psi[i], (x, Omega[0], Omega[1]))
-    c = A.LUsolve(b)
+    f = sym.sympify(f)
+    psi = [sym.sympify(p) for p in psi]
+    symbols = set().union(*[sym.sympify(e).free_symbols for e in [f] + psi + list(Omega)])
+    if method == 'auto' and symbols - {x}:
+        method = 'symbolic'
+
+    if method == 'auto' and all(e.is_polynomial(x) for e in [f] + psi) and \
+            all(sym.sympify(w).is_Number for w in Omega):
+        def integral(e):
+            P = sym.Poly(e, x).integrate()
+            return P.as_expr().subs(x, Omega[1]) - P.as_expr().subs(x, Omega[0])
+        A = sym.Matrix(N + 1, N + 1, lambda i, j: integral(psi[i] * psi[j]))
+        b = sym.Matrix(N + 1, 1, lambda i, j: integral(f * psi[i]))
+        c = A.LUsolve(b)
+    elif method == 'auto':
+        f_f = sym.lambdify([x], f, modules='numpy')
+        psi_f = [sym.lambdify([x], p, modules='numpy') for p in psi]
+        Omega_f = [float(Omega[0]), float(Omega[1])]
+        def solve(n):
+            A, b = gram_system(f_f, lambda t, i: psi_f[i](t), N, *quadrature_rule(Omega_f, n))
+            return np.linalg.solve(A, b)
+        n = n_q or 2 * (N + 1) + 32
+        c = solve(n)
+        while n_q is None and n < 4096:
+            n *= 2
+            c_new = solve(n)
+            converged = np.allclose(c_new, c, rtol=1e-12, atol=1e-14 * np.abs(c_new).max())
+            c = c_new
+            if converged:
+                break
+        c = sym.Matrix(c)
+    else:
+        A = sym.zeros(N + 1, N + 1)
+        b = sym.zeros(N + 1, 1)
+        for i in range(N + 1):
+            for j in range(i, N + 1):
+                A[i, j] = sym.integrate(psi[i] * psi[j], (x, Omega[0], Omega[1]))
+                A[j, i] = A[i, j]  # Symmetric matrix
+            b[i, 0] = sym.integrate(f * psi[i], (x, Omega[0], Omega[1]))
+        c = A.LUsolve(b)
     u = 0
     for i in range(N + 1):
         u += c[i, 0] * psi[i]
     return u, c
-def regression(f, psi, points):
+
+def _point_chunks(points, chunk_size):
+    """
+    Yield the sample points in 1D blocks of at most chunk_size points from
+    an array, an np.memmap, the path of a .npy file (memory-mapped) or an
+    iterable of blocks, which are used as they come.
+    """
+    if isinstance(points, (str, os.PathLike)):
+        points = np.load(points, mmap_mode='r')
+    if isinstance(points, (np.ndarray, list, tuple)):
+        points = np.asarray(points).ravel()
+        chunk_size = chunk_size or len(points)
+        for start in range(0, len(points), chunk_size):
+            yield np.asarray(points[start:start + chunk_size], dtype=float)
+    else:
+        for chunk in points:
+            yield np.asarray(chunk, dtype=float).ravel()
+
+def regression(f, psi, points, chunk_size=None, method='qr'):
+    """
+    Least squares fit of f (sympy expression or function) by the sympy
+    basis psi at the sample points, streamed in blocks of chunk_size
+    points (see _point_chunks) so memory is O(chunk_size*N).
+    method='qr' updates a running R factor of [Psi | f] block by block
+    (TSQR), which keeps the conditioning of Psi; method='gram' accumulates
+    the normal equations Psi^T Psi c = Psi^T f instead. The final solve
+    uses lstsq. Return u (sympy) and c ((N+1, 1) array).
+    """
     N = len(psi) - 1
-    m = len(points)
-    
-    # Convert to numpy arrays for vectorized operations
-    points = np.array(points)
-    
-    # Create lambda functions
     x = sym.Symbol('x')
-    f_f = sym.lambdify([x], f, modules='numpy')
-    psi_f = [sym.lambdify([x], psi[i], modules='numpy') for i in range(N + 1)]
-    
-    # Build psi_matrix properly - ensure all outputs are 1D arrays of the same length
-    psi_matrix = np.zeros((m, N + 1))
-    for i in range(N + 1):
-        psi_val = psi_f[i](points)
-        # Ensure we have a 1D array of the correct length
-        if np.isscalar(psi_val):
-            psi_matrix[:, i] = psi_val  # Broadcast scalar to all points
+    f_f = sym.lambdify([x], f, modules='numpy') if isinstance(f, sym.Basic) else f
+    psi_f = sym.lambdify([x], list(psi), modules='numpy')
+
+    R = np.zeros((0, N + 2))
+    B = np.zeros((N + 1, N + 1))
+    d = np.zeros(N + 1)
+    for points_c in _point_chunks(points, chunk_size):
+        # Constant basis functions come back as scalars
+        psi_c = np.column_stack([np.broadcast_to(np.asarray(v, dtype=float), points_c.shape)
+                                 for v in psi_f(points_c)])
+        f_c = np.broadcast_to(np.asarray(f_f(points_c), dtype=float), points_c.shape)
+        if method == 'qr':
+            R = np.linalg.qr(np.vstack([R, np.column_stack([psi_c, f_c])]), mode='r')
         else:
-            psi_matrix[:, i] = psi_val.flatten()[:m]  # Take first m elements
-    
-    # Evaluate f at all points
-    f_values = f_f(points)
-    
-    # Build normal equations: B = psi_matrix^T @ psi_matrix, d = psi_matrix^T @ f_values
-    B = psi_matrix.T @ psi_matrix
-    d = psi_matrix.T @ f_values.reshape(-1, 1)
-    
-    # Solve for coefficients
-    c = np.linalg.solve(B, d)
-    
+            B += psi_c.T @ psi_c
+            d += psi_c.T @ f_c
+
+    if method == 'qr':
+        # R [c; -1] = [Q^T f residual]: solve the top N+1 rows
+        c = np.linalg.lstsq(R[:N + 1, :N + 1], R[:N + 1, N + 1], rcond=None)[0]
+    else:
+        c = np.linalg.lstsq(B, d, rcond=None)[0]
+    c = c.reshape(-1, 1)
+
     # Build approximation function
     u = sum(c[i, 0] * psi[i] for i in range(N + 1))
-    
     return u, c
 
 def comparison_plot(f, u, Omega, filename='tmp.pdf'):
     x = sym.Symbol('x')
-    f_f = sym.lambdify([x], f, modules='numpy')
-    u_f = sym.lambdify([x], u, modules='numpy')
+    # f and u may be sympy expressions or vectorized functions
+    f_f = sym.lambdify([x], f, modules='numpy') if isinstance(f, sym.Basic) else f
+    u_f = sym.lambdify([x], u, modules='numpy') if isinstance(u, sym.Basic) else u
     resolution = 401
     xcoor = linspace(Omega[0], Omega[1], resolution)
     exact = f_f(xcoor)
@@ -74,54 +144,200 @@ def comparison_plot(f, u, Omega, filename='tmp.pdf'):
 def traperzoidal(values, dx):
     return dx * (np.sum(values) - 0.5 * (values[0] + values[-1]))
 
-def least_squares_numerical(f, psi, N, x, integration_method='scipy', orthogonal_basis=False):
-    A = np.zeros((N + 1, N + 1))
-    b = np.zeros(N + 1)
-    Omega = [x[0], x[-1]]
-    dx = x[1] - x[0]
-    
-    for i in range(N + 1):
-        j_limit = i + 1 if orthogonal_basis else N + 1
-        for j in range(i, j_limit):
-            print('(%d,%d)' % (i, j))
-            
-            if integration_method == 'scipy':
-                def integrand_ij(x_val):
-                    return psi(x_val, i) * psi(x_val, j)
-                A_ij = scipy.integrate.quad(integrand_ij, Omega[0], Omega[1], 
-                                          epsabs=1e-9, epsrel=1e-9)[0]
-            elif integration_method == 'sympy':
-                def integrand_ij(x_val):
-                    return psi(x_val, i) * psi(x_val, j)
-                A_ij = scipy.integrate.quad(integrand_ij, Omega[0], Omega[1])[0]
-            else:
-                values = psi(x, i) * psi(x, j)
-                A_ij = traperzoidal(values, dx)
-            
-            A[i, j] = A_ij
-            if i != j:
-                A[j, i] = A_ij
-        
-        # Compute b[i]
-        if integration_method in ['scipy', 'sympy']:
-            def integrand_b(x_val):
-                return f(x_val) * psi(x_val, i)
-            b_i = scipy.integrate.quad(integrand_b, Omega[0], Omega[1], 
-                                     epsabs=1e-9, epsrel=1e-9)[0]
+@functools.lru_cache(maxsize=32)
+def _reference_rule(n_q, method):
+    """n_q-point rule on [-1, 1], computed once per (n_q, method)."""
+    if method == 'trapezoidal':
+        X = np.linspace(-1, 1, n_q)
+        W = np.full(n_q, 2.0 / (n_q - 1))
+        W[[0, -1]] /= 2
+    elif method == 'gauss':
+        X, W = scipy.special.roots_legendre(n_q)
+    elif method == 'clenshaw_curtis':
+        n = n_q - 1
+        theta = np.pi * np.arange(n_q) / n
+        X = np.cos(theta)[::-1]
+        j = np.arange(1, n // 2 + 1)
+        b_j = np.where(2 * j == n, 1.0, 2.0)
+        W = 1 - (b_j / (4 * j**2 - 1)) @ np.cos(2 * np.outer(j, theta))
+        W *= np.where((np.arange(n_q) == 0) | (np.arange(n_q) == n), 1.0, 2.0) / n
+    else:
+        raise ValueError('unknown quadrature method %r' % method)
+    X.flags.writeable = False
+    W.flags.writeable = False
+    return X, W
+
+def quadrature_rule(Omega, n_q, method='gauss'):
+    """
+    Points and weights of an n_q-point rule on Omega: 'trapezoidal'
+    (uniform points), 'gauss' (Gauss-Legendre) or 'clenshaw_curtis'.
+    """
+    a, b = Omega
+    X, W = _reference_rule(n_q, method)
+    return a + (b - a) / 2 * (X + 1), (b - a) / 2 * W
+
+def basis_matrix(psi, N, x):
+    """
+    Values of psi(x, i), i = 0, ..., N, on the points x as an (N+1, len(x))
+    array, in one broadcast call when psi allows it.
+    """
+    x = np.asarray(x, dtype=float)
+    i = np.arange(N + 1)[:, None]
+    try:
+        Psi = np.asarray(psi(x[None, :], i), dtype=float)
+        if Psi.shape == (N + 1, len(x)):
+            return Psi
+    except (TypeError, ValueError, IndexError):
+        pass
+    return np.array([np.broadcast_to(psi(x, k), x.shape) for k in range(N + 1)], dtype=float)
+
+def gram_system(f, psi, N, x_q, w_q, orthogonal_basis=False):
+    """
+    Least squares system A = Psi W Psi^T, b = Psi W f of the basis psi for
+    the quadrature points x_q and weights w_q, with Psi = basis_matrix.
+    With orthogonal_basis, only the diagonal of A is computed.
+    """
+    Psi = basis_matrix(psi, N, x_q)
+    Psi_w = Psi * w_q
+    b = Psi_w @ f(x_q)
+    if orthogonal_basis:
+        return np.einsum('iq,iq->i', Psi_w, Psi), b
+    return Psi_w @ Psi.T, b
+
+def _family_values(family, N, x, Omega):
+    """Values (N+1, len(x)) of the basis family on Omega."""
+    a, b = Omega
+    i = np.arange(N + 1)[:, None]
+    half = np.pi * (x - a) / (b - a)    # [a, b] -> [0, pi]
+    t = 2 * (x - a) / (b - a) - 1       # [a, b] -> [-1, 1]
+    if family == 'sine':
+        return np.sin((i + 1) * half)
+    if family == 'sine_periodic':
+        return np.sin((i + 1) * 2 * half)
+    if family == 'cosine':
+        return np.cos(i * half)
+    if family == 'cosine_periodic':
+        return np.cos(i * 2 * half)
+    if family == 'chebyshev':
+        return scipy.special.eval_chebyt(i, t)
+    return scipy.special.eval_legendre(i, t)
+
+BASIS_FAMILIES = ['sine', 'sine_periodic', 'cosine', 'cosine_periodic', 'chebyshev', 'legendre']
+
+def basis_family(psi, N, Omega):
+    """
+    Recognise psi(x, i), i = 0, ..., N, by probing it at a few points of
+    Omega = [a, b]: 'sine' (sin((i+1)s)) or 'cosine' (cos(i s)) with
+    s = pi(x-a)/(b-a) in [0, pi], 'sine_periodic' or 'cosine_periodic'
+    with s in [0, 2pi] (e.g. sin((i+1)x) on [0, 2pi]), 'chebyshev' (T_i)
+    or 'legendre' (P_i) of t = 2(x-a)/(b-a) - 1. Return None otherwise.
+    """
+    a, b = Omega
+    probe = a + (b - a) * np.array([0.0, 0.1234, 0.3183, 0.5772, 0.7071, 0.9, 1.0])
+    try:
+        Psi = basis_matrix(psi, N, probe)
+    except (TypeError, ValueError):
+        return None
+    for family in BASIS_FAMILIES:
+        if np.allclose(Psi, _family_values(family, N, probe, Omega), rtol=1e-10, atol=1e-10):
+            return family
+    return None
+
+def spectral_coefficients(f, family, N, Omega, n_q):
+    """
+    Projection coefficients of f on a basis family (see basis_family)
+    from n_q samples: DST/DCT on midpoints for 'sine' and 'cosine', a real
+    FFT for the periodic ones, a DCT on Chebyshev points for 'chebyshev',
+    all O(n_q log n_q). These are L2 projections, except for 'chebyshev'
+    which is orthogonal for the weight 1/sqrt(1-t^2). 'legendre' uses
+    Gauss-Legendre quadrature, O(N n_q).
+    """
+    a, b = Omega
+    to_x = lambda s: a + (b - a) * s
+    midpoints = (np.arange(n_q) + 0.5) / n_q
+    if family == 'sine':
+        return scipy.fft.dst(f(to_x(midpoints)), type=2)[:N + 1] / n_q
+    if family == 'cosine' or family == 'chebyshev':
+        if family == 'chebyshev':
+            # Chebyshev points t_j = cos(pi*midpoints) in increasing order
+            c = scipy.fft.dct(f(to_x((1 - np.cos(np.pi * midpoints)) / 2))[::-1], type=2)[:N + 1] / n_q
         else:
-            values = f(x) * psi(x, i)
-            b_i = traperzoidal(values, dx)
-        b[i] = b_i
-    
+            c = scipy.fft.dct(f(to_x(midpoints)), type=2)[:N + 1] / n_q
+        c[0] /= 2
+        return c
+    if family in ['sine_periodic', 'cosine_periodic']:
+        # Trapezoidal rule: f(a) and f(b) share the first sample
+        samples = f(to_x(np.arange(n_q + 1) / n_q))
+        samples[0] = (samples[0] + samples[-1]) / 2
+        F = scipy.fft.rfft(samples[:-1]) / n_q
+        if family == 'sine_periodic':
+            return -2 * F[1:N + 2].imag
+        c = 2 * F[:N + 1].real
+        c[0] /= 2
+        return c
+    X, W = _reference_rule(n_q, 'gauss')
+    P = _family_values('legendre', N, to_x((X + 1) / 2), Omega)
+    return (np.arange(N + 1) + 0.5) * (P @ (W * f(to_x((X + 1) / 2))))
 
+def least_squares_numerical(f, psi, N, x, integration_method='gauss', orthogonal_basis=False,
+                            n_q=None):
+    """
+    Least squares approximation of f by psi(x, i), i = 0, ..., N, on
+    [x[0], x[-1]]. The integrals are computed with the quadrature rule
+    integration_method ('gauss', 'clenshaw_curtis', or 'trapezoidal' on
+    the points x) on n_q points (default max(len(x), 4*(N+1))), or entry
+    by entry with scipy.integrate.quad for 'scipy'.
+    'transform' recognises the basis (see basis_family) and computes the
+    coefficients with fast transforms instead of a Gram matrix (see
+    spectral_coefficients); Chebyshev bases are projected with the
+    Chebyshev weight. Their midpoint and trapezoidal rules are second
+    order for non-periodic f, so use enough points.
+    Return the approximation u on the points x and its coefficients c.
+    """
+    x = np.asarray(x, dtype=float)
+    Omega = [x[0], x[-1]]
 
+    if integration_method == 'transform':
+        family = basis_family(psi, N, Omega)
+        if family is None:
+            raise ValueError('psi is not a sine, cosine, Chebyshev or Legendre basis')
+        c = spectral_coefficients(f, family, N, Omega, n_q or max(len(x), 4 * (N + 1)))
+        return c @ basis_matrix(psi, N, x), c
+
+    if integration_method in ['scipy', 'sympy']:
+        A = np.zeros((N + 1, N + 1))
+        b = np.zeros(N + 1)
+        for i in range(N + 1):
+            j_limit = i + 1 if orthogonal_basis else N + 1
+            for j in range(i, j_limit):
+                A[i, j] = scipy.integrate.quad(lambda t: psi(t, i) * psi(t, j), Omega[0], Omega[1],
+                                               epsabs=1e-9, epsrel=1e-9)[0]
+                A[j, i] = A[i, j]
+            b[i] = scipy.integrate.quad(lambda t: f(t) * psi(t, i), Omega[0], Omega[1],
+                                        epsabs=1e-9, epsrel=1e-9)[0]
+        if orthogonal_basis:
+            A = np.diag(A)
+    else:
+        if integration_method == 'trapezoidal':
+            # Trapezoidal rule on the given points
+            x_q = x
+            w_q = np.zeros_like(x)
+            w_q[:-1] += np.diff(x) / 2
+            w_q[1:] += np.diff(x) / 2
+        else:
+            x_q, w_q = quadrature_rule(Omega, n_q or max(len(x), 4 * (N + 1)), integration_method)
+        A, b = gram_system(f, psi, N, x_q, w_q, orthogonal_basis)
 
     # Solve for coefficients
     if orthogonal_basis:
-        c = b / np.diag(A)
+        c = b / A
     else:
         c = np.linalg.solve(A, b)
 
+    # Build the approximation on x
+    u = c @ basis_matrix(psi, N, x)
+    return u, c
+
 def Lagrange_polynomials(x,i,points):
     p=1
     for k in range(len(points)):
@@ -138,17 +354,6 @@ def Lagrange_polynomials_01(x,N):
     psi=[Lagrange_polynomials(x,i, points) for i in range(N)]
     return psi, points
 
-
-    # Build the approximation function
-    def u_func(x_vals):
-        result = np.zeros_like(x_vals)
-        for i in range(N + 1):
-            result += c[i] * psi(x_vals, i)
-        return result
-    
-    u = u_func(x)
-    return u, c
-
 def save_plot_to_file(x, exact_func, approx_values, filename='least_squares_approximation.pdf'):
     """Save the comparison plot to a file"""
     plt.figure(figsize=(10, 6))
@@ -164,17 +369,41 @@ def save_plot_to_file(x, exact_func, approx_values, filename='least_squares_appr
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     plt.close()
     print(f"Plot saved as {filename}")
-def interpolation(f, psi, points):
+def interpolation(f, psi, points, method='symbolic'):
+    """
+    Interpolate f at the points with the basis psi. Return u and c: by
+    default u is the simplified sympy sum and c the list of sympy
+    coefficients. method='numeric' avoids sympy: when psi is the Lagrange
+    basis of the points (psi_j(x_i) = delta_ij, or psi=None), c holds f at
+    the points and u is a function evaluating the interpolant in
+    barycentric form, with no linear solve; otherwise c solves the
+    interpolation system with numpy and u is the sympy sum.
+    """
+    x = sym.Symbol('x')
+    f_f = sym.lambdify([x], f) if isinstance(f, sym.Basic) else f
+    if method == 'numeric':
+        points = np.array(points, dtype=float)
+        values = np.broadcast_to(np.asarray(f_f(points), dtype=float), points.shape)
+        if psi is not None:
+            psi_f = sym.lambdify([x], list(psi), modules='numpy')
+            A = np.column_stack([np.broadcast_to(np.asarray(v, dtype=float), points.shape)
+                                 for v in psi_f(points)])
+        if psi is None or np.allclose(A, np.eye(len(points))):
+            c = values.copy()
+            return lambda x: barycentric_interpolate(points, c, x), c
+        c = np.linalg.solve(A, values)
+        return sum(c[i]*psi[i] for i in range(len(psi))), c
+    elif method != 'symbolic':
+        raise ValueError('unknown method %r' % method)
+
     N = len(psi) - 1
     A = sym.zeros(N+1, N+1)
     b = sym.zeros(N+1, 1)
     psi_sym = psi # save symbolic expression
     # Turn psi and f into Python functions
-    x = sym.Symbol('x')
     psi = []
     for i in range(N+1):
         psi.append(sym.lambdify([x], psi_sym[i]))
-    f_f = sym.lambdify([x], f)
     for i in range(N+1):
         for j in range(N+1):    
             A[i,j] = psi[j](points[i])
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import numpy as np
+from dynamic_bar_simulation import run_simulation, bar_matrices
+from newmark import newmark
+
+
+def test_modal_path():
+    # Modal superposition must fill the same frames as time stepping
+    with tempfile.TemporaryDirectory() as tmp:
+        modal_path = os.path.join(tmp, 'modal.npy')
+        stepped_path = os.path.join(tmp, 'stepped.npy')
+        run_simulation(Ne=20, T=0.5, modal_modes=30, modes_cache=None,
+                       snapshot_path=modal_path, animate=False)
+        run_simulation(Ne=20, T=0.5, dt=1e-4, snapshot_stride=125,
+                       snapshot_path=stepped_path, animate=False)
+        modal = np.load(modal_path)
+        stepped = np.load(stepped_path)
+        n = min(len(modal), len(stepped))
+        error = np.abs(modal[:n] - stepped[:n]).max()
+        print(f"modal vs time stepping: {error:.2e}")
+        assert error < 1e-2
+
+
+def test_resume_needs_checkpoint():
+    try:
+        run_simulation(resume=True, animate=False)
+    except ValueError as e:
+        print(e)
+    else:
+        raise AssertionError('resume=True without checkpoint_path should fail')
+
+    nodes, free_dofs, M, K = bar_matrices(Ne=5)
+    f = np.zeros((len(free_dofs), 10))
+    try:
+        newmark(M, None, K, f, np.zeros(len(free_dofs)), np.zeros(len(free_dofs)), 1e-3,
+                resume=True)
+    except ValueError as e:
+        print(e)
+    else:
+        raise AssertionError('newmark resume=True without checkpoint_path should fail')
+
+
+if __name__ == "__main__":
+    test_modal_path()
+    test_resume_needs_checkpoint()
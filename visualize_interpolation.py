@@ -3,7 +3,7 @@ Génération de graphiques pour le cours sur l'interpolation
 """
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.interpolate import lagrange
+from fe_appprox1D import barycentric_interpolate, interpolation_nodes
 
 def plot_lagrange_basis():
     """Visualiser les polynômes de base de Lagrange"""
@@ -43,8 +43,7 @@ def plot_hermite_vs_lagrange():
     y_nodes = np.sin(nodes)
     
     # Lagrange (passe par les points)
-    poly_lagrange = lagrange(nodes, y_nodes)
-    y_lagrange = poly_lagrange(x)
+    y_lagrange = barycentric_interpolate(nodes, y_nodes, x)
     
     plt.figure(figsize=(12, 6))
     plt.plot(x, y_exact, 'k--', label='Fonction exacte (sin x)', linewidth=1.5, alpha=0.7)
@@ -78,13 +77,14 @@ def plot_runge_phenomenon():
     plt.figure(figsize=(10, 6))
     plt.plot(x, f(x), 'k-', linewidth=2, label='Fonction de Runge')
     
-    # Lagrange ordre élevé
+    # Lagrange ordre élevé: noeuds équidistants contre noeuds de Chebyshev
     for n in [5, 11]:
-        nodes = np.linspace(-1, 1, n)
-        y_nodes = f(nodes)
-        poly = lagrange(nodes, y_nodes)
-        plt.plot(x, poly(x), label=f'Lagrange N={n}')
-        plt.plot(nodes, y_nodes, 'o', markersize=4)
+        for distribution, style in [('uniform', '-'), ('Chebyshev', '--')]:
+            nodes = interpolation_nodes(-1, 1, n - 1, distribution)
+            y_nodes = f(nodes)
+            plt.plot(x, barycentric_interpolate(nodes, y_nodes, x), style,
+                     label=f'Lagrange N={n} ({distribution})')
+            plt.plot(nodes, y_nodes, 'o', markersize=4)
         
     plt.ylim(-0.5, 1.5)
     plt.title('Limites de Lagrange: Phénomène de Runge', fontsize=14)